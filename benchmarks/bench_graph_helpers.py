@@ -0,0 +1,186 @@
+"""Times the bot's graph helpers on fixed board fixtures and compares against a saved baseline.
+
+Usage:
+    python benchmarks/bench_graph_helpers.py                  # run, compare with baseline.json if present
+    python benchmarks/bench_graph_helpers.py --save-baseline  # run and store the results as the new baseline
+    python benchmarks/bench_graph_helpers.py --filter cut     # only cases whose name contains "cut"
+
+The baseline is machine specific, so it is not committed.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+from time import perf_counter
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, ".."))
+import local_engine
+
+
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+DEFAULT_BOT = os.path.join(BENCHMARK_DIR, "..", "gacha-v2-4.py")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+MIN_TIME = 0.2 # Seconds each timing run lasts at least
+REPEATS = 5 # Timing runs per case, the fastest is reported
+REGRESSION_TOLERANCE = 0.15 # Slowdown vs. baseline reported as a regression
+
+
+def load_fixture(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+# Local engine board in the fixture's position, seen by the fixture's player
+def load_board(fixture: dict) -> local_engine.LocalGame:
+    engine = local_engine.LocalEngine(fixture["num_players"])
+    engine.turn_order = list(range(fixture["num_players"]))
+    engine.turns = fixture["turn"]
+    engine.card_sets_redeemed = fixture["card_sets_redeemed"]
+    for x, (occupier, troops) in enumerate(zip(fixture["owners"], fixture["troops"])):
+        engine.territories[x].occupier = occupier
+        engine.territories[x].troops = troops
+    for player in engine.players.values():
+        player.alive = player.player_id in fixture["alive"]
+    engine.players[fixture["me"]].troops_remaining = fixture["troops_remaining"]
+    return engine.games[fixture["me"]]
+
+
+# Each case builder returns a function that runs one batch of calls and returns how many calls it made
+def make_cases(m, game: local_engine.LocalGame) -> dict:
+    static_map = m.get_static_map(game)
+    snapshot = m.get_snapshot(game)
+    me = snapshot.me
+    my_territories = snapshot.get_owned(me)
+    my_border = snapshot.get_border(me)
+    enemy_territories = [x for x in range(static_map.territory_count) if snapshot.owner[x] != me]
+    enemy_clusters = m.get_clusters(game, enemy_territories)
+    border_mask = m.to_mask(my_border)
+    interior = [x for x in my_territories if not border_mask >> x & 1]
+    self_state = m.SelfState(static_map)
+    self_state.deadline.budget = math.inf
+
+    def clear_caches():
+        static_map.cut_cache.clear()
+        static_map.attack_order_cache.clear()
+        m.path_cache.entries.clear()
+
+    def bench_get_clusters():
+        m.get_clusters(game, enemy_territories)
+        return 1
+
+    def bench_search_paths():
+        for cluster in enemy_clusters:
+            m.search_best_paths_to_cluster(game, cluster, my_border, 0)
+        return len(enemy_clusters)
+
+    def bench_cached_paths():
+        for cluster in enemy_clusters:
+            m.get_best_paths_to_cluster(game, cluster, my_border, 0)
+        return len(enemy_clusters)
+
+    def bench_cut_node():
+        calls = 0
+        for cluster in enemy_clusters:
+            static_map.cut_cache.clear()
+            for target in cluster:
+                m.is_target_cut_node(game, cluster, target)
+                calls += 1
+        return calls
+
+    def bench_sort_attack_priority():
+        for cluster in enemy_clusters:
+            static_map.cut_cache.clear()
+            m.sort_attack_priority(game, cluster, cluster)
+        return len(enemy_clusters)
+
+    def bench_shortest_path():
+        sources = interior if len(interior) > 0 else my_territories
+        target_mask = border_mask if len(interior) > 0 else m.to_mask(enemy_territories)
+        for source in sources:
+            m.find_shortest_path_from_vertex_to_set(game, source, target_mask)
+        return len(sources)
+
+    def bench_generate_priority_clusters():
+        clear_caches()
+        m.generate_priority_clusters(game, self_state, game.state.me.troops_remaining)
+        return 1
+
+    return {
+        "get_clusters": bench_get_clusters,
+        "search_best_paths_to_cluster": bench_search_paths,
+        "get_best_paths_to_cluster (cached)": bench_cached_paths,
+        "is_target_cut_node (cold)": bench_cut_node,
+        "sort_attack_priority (cold)": bench_sort_attack_priority,
+        "find_shortest_path_from_vertex_to_set": bench_shortest_path,
+        "generate_priority_clusters (cold)": bench_generate_priority_clusters,
+    }
+
+# Best of REPEATS runs, in calls per second
+def measure(func, min_time: float) -> float:
+    func() # Warm up lazily built tables
+    best = math.inf
+    for _ in range(REPEATS):
+        calls = 0
+        start = perf_counter()
+        while True:
+            calls += func()
+            elapsed = perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / max(calls, 1))
+    return 1 / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot's graph helpers on fixture boards.")
+    parser.add_argument("--bot", default=DEFAULT_BOT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--filter", default="", help="only run cases whose 'fixture/case' name contains this")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME)
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 if any case regressed")
+    args = parser.parse_args()
+
+    baseline: dict[str, float] = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results: dict[str, float] = {}
+    regressions: list[str] = []
+    print("%-58s %14s %12s" % ("case", "ops/sec", "vs baseline"), flush=True)
+    for fixture_path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json"))):
+        fixture = load_fixture(fixture_path)
+        # Fresh module per fixture so caches never carry over between boards
+        m = local_engine.load_bot_module(args.bot)
+        m.logger.level = m.LOG_OFF
+        game = load_board(fixture)
+        for case_name, func in make_cases(m, game).items():
+            name = "%s/%s" % (fixture["name"], case_name)
+            if args.filter not in name:
+                continue
+            ops = measure(func, args.min_time)
+            results[name] = ops
+            comparison = ""
+            if name in baseline:
+                ratio = ops / baseline[name]
+                comparison = "%.2fx" % ratio
+                if ratio < 1 - REGRESSION_TOLERANCE:
+                    comparison += " REGRESSION"
+                    regressions.append(name)
+            print("%-58s %14.1f %12s" % (name, ops, comparison), flush=True)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print("saved baseline to %s" % args.baseline, flush=True)
+    elif len(regressions) > 0:
+        print("%d case(s) more than %d%% slower than baseline" % (len(regressions), 100 * REGRESSION_TOLERANCE), flush=True)
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Checks the bot's CardSetSolver against a brute force over random hands, then times it.
+
+The brute force tries every way to pull min_sets to max_sets disjoint sets out of the hand and scores each
+with the solver's own get_score, so any disagreement is a search bug rather than a different tie-break.
+
+Usage:
+    python benchmarks/check_card_set_solver.py
+    python benchmarks/check_card_set_solver.py --hands 10000 --seed 3
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+from time import perf_counter
+from typing import Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, ".."))
+import local_engine
+
+
+DEFAULT_BOT = os.path.join(BENCHMARK_DIR, "..", "gacha-v2-4.py")
+MAX_HAND_SIZE = 9 # Largest hand checked, the brute force grows quickly past this
+CARDS_PER_KIND = 8 # Copies of each plain card kind in the random pool
+
+
+def is_valid_set(solver, kinds: tuple[int, ...]) -> bool:
+    symbols = set(kind // 2 for kind in kinds if kind != solver.WILDCARD_KIND)
+    return solver.WILDCARD_KIND in kinds or len(symbols) in (1, solver.WILDCARD_KIND // 2)
+
+# Best solver score over every combination of min_sets to max_sets sets, or None if min_sets can't be made
+def brute_force(solver, hand: list[int], min_sets: int, max_sets: int, bonus_available: bool) -> Optional[tuple]:
+    best = None
+
+    def search(remaining: frozenset, sets: list[tuple[int, ...]]):
+        nonlocal best
+        if len(sets) >= min_sets:
+            counts = [0] * (solver.WILDCARD_KIND + 1)
+            for x in remaining:
+                counts[hand[x]] += 1
+            bonus = bonus_available and any(hand[x] % 2 == 1 for card_set in sets for x in card_set)
+            score = solver.get_score(tuple(counts), len(sets), bonus)
+            if best == None or score > best:
+                best = score
+        if len(sets) < max_sets:
+            for card_set in itertools.combinations(sorted(remaining), 3):
+                if is_valid_set(solver, tuple(hand[x] for x in card_set)):
+                    search(remaining - set(card_set), sets + [card_set])
+
+    search(frozenset(range(len(hand))), [])
+    return best
+
+# Score of the solver's answer, after checking every set is valid and drawn from the hand
+def get_solution_score(solver, counts: tuple[int, ...], solution, bonus_available: bool) -> tuple:
+    remaining = list(counts)
+    for kinds in solution:
+        assert is_valid_set(solver, kinds), "invalid set %s" % (kinds,)
+        for kind in kinds:
+            remaining[kind] -= 1
+    assert min(remaining) >= 0, "solution uses cards not in the hand"
+    bonus = bonus_available and any(kind % 2 == 1 for kinds in solution for kind in kinds)
+    return solver.get_score(tuple(remaining), len(solution), bonus)
+
+def random_hand(solver, rng: random.Random, size: int) -> list[int]:
+    pool = [kind for kind in range(solver.WILDCARD_KIND) for _ in range(CARDS_PER_KIND)] + [solver.WILDCARD_KIND] * 2
+    return rng.sample(pool, size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check CardSetSolver against a brute force and time it.")
+    parser.add_argument("--bot", default=DEFAULT_BOT)
+    parser.add_argument("--hands", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    m = local_engine.load_bot_module(args.bot)
+    solver = m.card_set_solver
+    rng = random.Random(args.seed)
+
+    mismatches = 0
+    for _ in range(args.hands):
+        hand = random_hand(solver, rng, rng.randint(0, MAX_HAND_SIZE))
+        counts = tuple(hand.count(kind) for kind in range(solver.WILDCARD_KIND + 1))
+        # Same bounds handle_redeem_cards uses: forced sets only, or as many as possible
+        min_sets = m.get_guaranteed_sets(len(hand))
+        max_sets = rng.choice([min_sets, len(hand) // 3])
+        bonus_available = rng.random() < 0.7
+
+        solution = solver.solve(counts, min_sets, max_sets, bonus_available)
+        expected = brute_force(solver, hand, min_sets, max_sets, bonus_available)
+        actual = None if solution == None else get_solution_score(solver, counts, solution, bonus_available)
+        if actual != expected:
+            mismatches += 1
+            print("mismatch: hand %s, sets %d-%d, bonus %s: solver %s, brute force %s" % (hand, min_sets, max_sets, bonus_available, actual, expected), flush=True)
+    print("%d hands checked, %d mismatches" % (args.hands, mismatches), flush=True)
+
+    for label in ["cold", "cached"]:
+        if label == "cold":
+            solver.cache.clear()
+        timing_rng = random.Random(args.seed)
+        start = perf_counter()
+        for _ in range(args.hands):
+            hand = random_hand(solver, timing_rng, timing_rng.randint(5, MAX_HAND_SIZE))
+            counts = tuple(hand.count(kind) for kind in range(solver.WILDCARD_KIND + 1))
+            solver.solve(counts, m.get_guaranteed_sets(len(hand)), len(hand) // 3, True)
+        print("%-7s %8.1f us per solve" % (label, 1e6 * (perf_counter() - start) / args.hands), flush=True)
+
+    if mismatches > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
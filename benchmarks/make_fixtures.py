@@ -0,0 +1,105 @@
+"""Regenerates the board fixtures used by bench_graph_helpers.py from seeded local engine games.
+
+Usage:
+    python benchmarks/make_fixtures.py
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import local_engine
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "gacha-v2-4.py")
+LINEUP = [BOT_PATH, BOT_PATH, BOT_PATH, "random", "random"]
+MAX_SEEDS = 200
+
+
+def is_early_game(engine: local_engine.LocalEngine, player_id: int) -> bool:
+    # Our first turn after setup
+    return engine.turns <= engine.num_players
+
+def is_mid_game(engine: local_engine.LocalEngine, player_id: int) -> bool:
+    # Everyone alive and our territories split into many pieces
+    owned = engine.get_owned(player_id)
+    return len(engine.get_alive()) == engine.num_players and len(owned) >= 8 and count_pieces(engine, owned) >= 4
+
+def is_late_game(engine: local_engine.LocalEngine, player_id: int) -> bool:
+    return 2 <= len(engine.get_alive()) <= 3 and engine.card_sets_redeemed > 5
+
+PHASES = {
+    "early_game": (is_early_game, "First turn after setup, 5 players, scattered claims"),
+    "mid_game": (is_mid_game, "5 players alive, our territories split into 4+ pieces"),
+    "late_game": (is_late_game, "2-3 players left after 6+ card sets were redeemed"),
+}
+
+
+def count_pieces(engine: local_engine.LocalEngine, territories: list[int]) -> int:
+    remaining = set(territories)
+    pieces = 0
+    while remaining:
+        pieces += 1
+        frontier = [remaining.pop()]
+        while frontier:
+            for x in engine.map.adjacent[frontier.pop()]:
+                if x in remaining:
+                    remaining.remove(x)
+                    frontier.append(x)
+    return pieces
+
+def to_fixture(engine: local_engine.LocalEngine, player_id: int, name: str, description: str, seed: int) -> dict:
+    return {
+        "name": name,
+        "description": description,
+        "seed": seed,
+        "num_players": engine.num_players,
+        "me": player_id,
+        "turn": engine.turns,
+        "card_sets_redeemed": engine.card_sets_redeemed,
+        "alive": engine.get_alive(),
+        "troops_remaining": engine.players[player_id].troops_remaining,
+        "owners": [engine.territories[x].occupier for x in range(local_engine.NUM_TERRITORIES)],
+        "troops": [engine.territories[x].troops for x in range(local_engine.NUM_TERRITORIES)],
+    }
+
+# Wraps a bot and stores the board whenever it is asked to distribute troops in a phase still missing
+class FixtureCatcher():
+    def __init__(self, bot, engine: local_engine.LocalEngine, fixtures: dict, seed: int):
+        self.bot = bot
+        self.engine = engine
+        self.fixtures = fixtures
+        self.seed = seed
+
+    def choose_move(self, game: local_engine.LocalGame, query: local_engine.LocalQuery):
+        if query.query_type == "distribute_troops":
+            for name, (condition, description) in PHASES.items():
+                if name not in self.fixtures and condition(self.engine, game.player_id):
+                    self.fixtures[name] = to_fixture(self.engine, game.player_id, name, description, self.seed)
+        return self.bot.choose_move(game, query)
+
+
+def main():
+    fixtures: dict[str, dict] = {}
+    for seed in range(MAX_SEEDS):
+        if len(fixtures) == len(PHASES):
+            break
+        engine = local_engine.LocalEngine(len(LINEUP), seed)
+        bots = {x: local_engine.make_bot(spec, seed * len(LINEUP) + x) for x, spec in enumerate(LINEUP)}
+        bots[0] = FixtureCatcher(bots[0], engine, fixtures, seed)
+        engine.play(bots)
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for name, fixture in fixtures.items():
+        # One key per line keeps the territory lists readable in diffs
+        with open(os.path.join(FIXTURE_DIR, name + ".json"), "w") as f:
+            f.write("{\n" + ",\n".join("    %s: %s" % (json.dumps(key), json.dumps(value)) for key, value in fixture.items()) + "\n}\n")
+        print("wrote %s (seed %d, turn %d)" % (name, fixture["seed"], fixture["turn"]), flush=True)
+    for name in PHASES:
+        if name not in fixtures:
+            print("no game reached %s" % name, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Replays a recorded local engine game through one or more bots, timing every query.
+
+For the chosen seat, each move in the recording is turned back into the query that produced it
+and handed to the bot. The recorded move is then applied, whatever the bot answered, so every
+bot sees exactly the same sequence of boards.
+
+Usage:
+    python local_engine.py --seed 7 gacha-v2-4.py gacha-v2-3.py random random random --save game.json
+    python benchmarks/replay_game.py game.json --seat 0
+    python benchmarks/replay_game.py game.json --bot gacha-v2-3.py --bot gacha-v2-4.py
+"""
+import argparse
+import os
+import statistics
+import sys
+import tracemalloc
+from collections import defaultdict
+from time import perf_counter
+from typing import Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, ".."))
+import local_engine
+
+
+DEFAULT_BOTS = [os.path.join(BENCHMARK_DIR, "..", "gacha-v2-3.py"), os.path.join(BENCHMARK_DIR, "..", "gacha-v2-4.py")]
+
+
+# Query the recorded move answered, or None if the record is not a move
+def get_query(record: local_engine.LocalRecord) -> Optional[local_engine.LocalQuery]:
+    match record:
+        case local_engine.MoveClaimTerritory():
+            return local_engine.QueryClaimTerritory()
+        case local_engine.MovePlaceInitialTroop():
+            return local_engine.QueryPlaceInitialTroop()
+        case local_engine.MoveRedeemCards():
+            return local_engine.QueryRedeemCards(cause=record.cause)
+        case local_engine.MoveDistributeTroops():
+            return local_engine.QueryDistributeTroops(cause=record.cause)
+        case local_engine.MoveAttack() | local_engine.MoveAttackPass():
+            return local_engine.QueryAttack()
+        case local_engine.MoveTroopsAfterAttack():
+            return local_engine.QueryTroopsAfterAttack(record_attack_id=record.record_attack_id)
+        case local_engine.MoveDefend():
+            return local_engine.QueryDefend(move_attack_id=record.move_attack_id)
+        case local_engine.MoveFortify() | local_engine.MoveFortifyPass():
+            return local_engine.QueryFortify()
+    return None
+
+
+class QueryStats():
+    def __init__(self):
+        self.times: list[float] = []
+        self.peaks: list[int] = [] # Bytes allocated at peak during the query
+        self.matches: int = 0 # Answers identical to the recorded move
+        self.errors: int = 0
+
+
+# Replays records through a fresh copy of the bot for seat, returning stats per query type
+def replay(bot_path: str, num_players: int, records: list[local_engine.LocalRecord], seat: int, trace_memory: bool) -> dict[str, QueryStats]:
+    stats: dict[str, QueryStats] = defaultdict(QueryStats)
+    engine = local_engine.LocalEngine(num_players)
+    bot = local_engine.HandlerBot(bot_path)
+    game = engine.games[seat]
+
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        for record in records:
+            query = get_query(record)
+            if query != None and record.move_by_player == seat:
+                query_stats = stats[query.query_type]
+                if trace_memory:
+                    tracemalloc.reset_peak()
+                    current_before = tracemalloc.get_traced_memory()[0]
+                start = perf_counter()
+                try:
+                    move = bot.choose_move(game, query)
+                    if move.to_dict() == record.to_dict():
+                        query_stats.matches += 1
+                except Exception:
+                    # The bot's own state can drift from the recording, keep going with the recorded move
+                    query_stats.errors += 1
+                query_stats.times.append(perf_counter() - start)
+                if trace_memory:
+                    query_stats.peaks.append(tracemalloc.get_traced_memory()[1] - current_before)
+            engine.record(record)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return stats
+
+
+def print_stats(bot_path: str, time_stats: dict[str, QueryStats], memory_stats: Optional[dict[str, QueryStats]]):
+    print("\n%s" % bot_path, flush=True)
+    print("%-22s %6s %10s %9s %9s %9s %9s %11s %8s %6s" % ("query", "count", "total ms", "mean ms", "p50 ms", "p95 ms", "max ms", "peak KiB", "match", "errors"), flush=True)
+    total = 0.0
+    for query_type in local_engine.QUERY_HANDLERS:
+        if query_type not in time_stats:
+            continue
+        stats = time_stats[query_type]
+        times = sorted(stats.times)
+        total += sum(times)
+        peak = "" if memory_stats == None else "%.1f" % (max(memory_stats[query_type].peaks) / 1024)
+        print("%-22s %6d %10.1f %9.3f %9.3f %9.3f %9.3f %11s %7.1f%% %6d" % (
+            query_type, len(times), 1000 * sum(times), 1000 * statistics.mean(times), 1000 * times[len(times) // 2],
+            1000 * times[min(len(times) - 1, int(len(times) * 0.95))], 1000 * times[-1], peak, 100 * stats.matches / len(times), stats.errors
+        ), flush=True)
+    print("%-22s %6s %10.1f" % ("all", "", 1000 * total), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded local engine game through bots and time each query.")
+    parser.add_argument("recording", help="JSON file written by local_engine.py --save")
+    parser.add_argument("--bot", action="append", default=None, help="bot script to replay (repeatable), defaults to gacha-v2-3.py and gacha-v2-4.py")
+    parser.add_argument("--seat", type=int, default=None, help="player whose queries are replayed, defaults to the first non-random seat")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    args = parser.parse_args()
+
+    metadata, records = local_engine.load_recording(args.recording)
+    bot_specs = metadata.get("bots", [])
+    num_players = len(bot_specs) if len(bot_specs) > 0 else local_engine.NUM_PLAYERS
+    seat = args.seat
+    if seat == None:
+        seat = next((x for x, spec in enumerate(bot_specs) if spec != "random"), 0)
+    print("recording: %s, %d records, replaying seat %d (%s)" % (args.recording, len(records), seat, bot_specs[seat] if seat < len(bot_specs) else "?"), flush=True)
+
+    for bot_path in args.bot or DEFAULT_BOTS:
+        # Timing and memory come from separate passes, tracemalloc slows everything down
+        time_stats = replay(bot_path, num_players, records, seat, False)
+        memory_stats = None if args.no_memory else replay(bot_path, num_players, records, seat, True)
+        print_stats(bot_path, time_stats, memory_stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Builds the claim-phase opening book for gacha-v2-4.py from seeded local self-play.
+
+Only the setup phase is played. Every claim the bot makes is recorded under its opening book key, and positions
+that came up at least --min-seen times are written out. The bot answers those from the book and falls back to
+its own scoring on anything else.
+
+Usage:
+    python build_opening_book.py --games 2000
+    python build_opening_book.py --games 2000 gacha-v2-4.py gacha-v2-4.py gacha-v2-3.py random random
+"""
+import argparse
+import json
+import os
+from collections import Counter, defaultdict
+
+import local_engine
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BOT_PATH = os.path.join(REPO_DIR, "gacha-v2-4.py")
+DEFAULT_LINEUP = [BOT_PATH, BOT_PATH, os.path.join(REPO_DIR, "gacha-v2-3.py"), "random", "random"]
+
+
+# Wraps a bot and records (opening book key, claimed territory) for each of its claims
+class ClaimRecorder():
+    def __init__(self, bot: local_engine.HandlerBot, claims: dict[str, Counter]):
+        self.bot = bot
+        self.claims = claims
+        # Record what the bot works out itself, never what an older book says
+        self.bot.module.opening_book = {}
+
+    def choose_move(self, game: local_engine.LocalGame, query: local_engine.LocalQuery) -> local_engine.LocalRecord:
+        move = self.bot.choose_move(game, query)
+        if query.query_type == "claim_territory":
+            # The board is unchanged until the engine records the move, so the key is the one the bot looked up
+            self.claims[self.bot.module.get_opening_book_key(game, self.bot.self_state)][move.territory] += 1
+        return move
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the claim-phase opening book from seeded self-play.")
+    parser.add_argument("bots", nargs="*", default=DEFAULT_LINEUP, help="one spec per seat, claims are recorded for every seat running --bot")
+    parser.add_argument("--bot", default=BOT_PATH, help="bot script the book is built for")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, later games count up from it")
+    parser.add_argument("--min-seen", type=int, default=2, help="min. times a position must come up to go in the book")
+    parser.add_argument("--output", default=None, help="defaults to the bot's OPENING_BOOK_PATH")
+    args = parser.parse_args()
+
+    bot_path = os.path.abspath(args.bot)
+    claims: dict[str, Counter] = defaultdict(Counter)
+    version = None
+    output = args.output
+    for seed in range(args.seed, args.seed + args.games):
+        engine = local_engine.LocalEngine(len(args.bots), seed)
+        bots = {}
+        for x, spec in enumerate(args.bots):
+            bots[x] = local_engine.make_bot(spec, seed * len(args.bots) + x)
+            if spec != "random" and os.path.abspath(local_engine.parse_bot_spec(spec)[0]) == bot_path:
+                bots[x] = ClaimRecorder(bots[x], claims)
+                version = bots[x].bot.module.OPENING_BOOK_VERSION
+                output = output or bots[x].bot.module.OPENING_BOOK_PATH
+        engine.play_setup(bots)
+        if (seed - args.seed + 1) % max(1, args.games // 10) == 0:
+            print("played %d/%d setups, %d positions" % (seed - args.seed + 1, args.games, len(claims)), flush=True)
+
+    if version == None:
+        parser.error("no seat runs %s" % args.bot)
+
+    book: dict[str, int] = {}
+    conflicts = 0
+    for key, territories in claims.items():
+        if len(territories) > 1:
+            # The key should decide the claim, a disagreement means the bot read something the key leaves out
+            conflicts += 1
+        elif sum(territories.values()) >= args.min_seen:
+            book[key] = next(iter(territories))
+
+    with open(output, "w") as f:
+        json.dump({"version": version, "claims": book}, f, separators=(",", ":"), sort_keys=True)
+    print("wrote %d of %d positions to %s (%d conflicting)" % (len(book), len(claims), output, conflicts), flush=True)
+
+
+if __name__ == "__main__":
+    main()
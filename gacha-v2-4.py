@@ -1,5 +1,11 @@
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict, deque
+import atexit
+import functools
+import itertools
+import json
+import os
 import random
+import sys
 import heapq
 from typing import Optional, Tuple, Union, cast
 from risk_helper.game import Game
@@ -25,26 +31,69 @@ from risk_shared.records.moves.move_redeem_cards import MoveRedeemCards
 from risk_shared.records.moves.move_troops_after_attack import MoveTroopsAfterAttack
 from risk_shared.records.record_attack import RecordAttack
 from risk_shared.records.types.move_type import MoveType
-from time import time
+from time import perf_counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # Optional, SweepSimulator falls back to plain Python without it
 
 
 MIN_CHOKE = 4
-MIN_ATK = 5
-MIN_ATK_SINGLE = 3
-MIN_ATK_TROOP_DIFF = 2
+MIN_ATK_WIN_PROB = 0.6 # Min. chance of taking a territory (attacking until it falls or we run out) before attacking it
 MAX_PLAYER_CONTINENT_START = 2
 MAX_FORCED_ATK = 2 # Maximum num of troops in enemy territory for forced attack in early game
 INIT_MIN_TROOPS = 4
 LATE_MIN_TROOPS = 1
 DEFENSE_MULTIPLIER = 0.5
-TERRITORY_SCORE = 2
-ELIM_MOD = 3
-#ELIM_MOD_WORST = 4
 NOT_FOUND = -1
 #BONUS_TROOPS = 4 # Num. of surplus troops given to eliminating players
 INF_INT = 99999
 NEG_INF_INT = -99999
 
+CUT_CACHE_SIZE = 4096 # Max num. of cluster masks kept in StaticMap.cut_cache and attack_order_cache
+PATH_CACHE_SIZE = 1024 # Max num. of path searches kept in path_cache
+# Difficulty scores (get_cluster_difficulty_score, get_path_score) depend only on BATTLE_TABLE_CAP and the SWEEP_* constants
+BATTLE_TABLE_CAP = 64 # Max troops on either side covered by BattleTable, larger battles are scaled down to fit
+SWEEP_MIN_WIN_PROB = 0.7 # Min. win prob. of every battle for a cluster sweep to count as doable
+SWEEP_CACHE_SIZE = 4096 # Max num. of sweep estimates kept in SweepEstimator
+SWEEP_MAX_TROOPS = 1000 # Upper bound when searching the troops a sweep needs
+SIMULATION_SAMPLES = 1000 # Monte Carlo playouts per sweep plan with numpy
+SIMULATION_SAMPLES_FALLBACK = 100 # Playouts per sweep plan without numpy
+SIMULATION_MIN_GAIN = 0.05 # Extra expected clusters swept a split needs to replace the proportional one
+CARD_SYMBOLS = ("Infantry", "Cavalry", "Artillery") # CardModel.symbol of the plain cards
+WILDCARD_SYMBOL = "Wildcard" # CardModel.symbol of the wildcards, which complete any set
+CARD_SET_CACHE_SIZE = 4096 # Max num. of hands memoized by CardSetSolver
+CARD_SET_VALUES = (4, 6, 8, 10, 12, 15) # Troops for the 1st, 2nd, ... card set redeemed in the game
+CARD_SET_INCREMENT = 5 # Troops each set after CARD_SET_VALUES is worth over the one before
+OPENING_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.json") # Claim choices from build_opening_book.py, optional
+OPENING_BOOK_VERSION = 1 # Bump whenever the claim logic changes, books built for another version are ignored
+
+ROLLOUT_SEARCH_ENABLED = os.environ.get("GACHA_ROLLOUTS", "0") not in ("", "0") # Set GACHA_ROLLOUTS=1 to decide attacks by rollouts
+ROLLOUT_TIME_BUDGET = 0.15 # Seconds of rollouts per attack query, shared by every target it considers
+ROLLOUT_MIN_WIN_PROB = 0.3 # Battles less likely to be won than this are passed on without rollouts
+ROLLOUT_MAX_WIN_PROB = 0.9 # Battles at least this likely to be won are attacked without rollouts
+ROLLOUT_MIN = 32 # Rollouts run even past the time budget, fewer are too noisy to act on
+ROLLOUT_MAX = 4000 # Rollouts per attack decision
+ROLLOUT_CARD_VALUE = 4 # Troops the card for our first capture of the turn is worth
+ROLLOUT_INCOME_TURNS = 3 # Turns of income a board is credited with
+ROLLOUT_ENEMY_TROOP_WEIGHT = 0.7 # Value of destroying one enemy troop, in our troops
+ROLLOUT_ELIMINATION_VALUE = 10 # Troops eliminating a player is worth, for the cards we take
+ROLLOUT_EXPOSURE_WEIGHT = 0.5 # Share of the troops adjacent enemies could take back counted as lost
+
+QUERY_TIME_BUDGET = 1.0 # Seconds we allow ourselves per query, kept well under the engine's response timeout
+DEADLINE_MARGIN = 0.3 # Fraction of the budget left at which expensive stages fall back to cheaper heuristics
+
+PROFILE_ENABLED = os.environ.get("GACHA_PROFILE", "0") not in ("", "0") # Set GACHA_PROFILE=1 to time hot functions
+
+LOG_DEBUG = 10
+LOG_INFO = 20
+LOG_WARNING = 30
+LOG_OFF = 100
+LOG_LEVELS = {"debug": LOG_DEBUG, "info": LOG_INFO, "warning": LOG_WARNING, "off": LOG_OFF}
+LOG_LEVEL = LOG_LEVELS.get(os.environ.get("GACHA_LOG", "debug").lower(), LOG_DEBUG) # GACHA_LOG=off for tournament runs
+LOG_BUFFER_SIZE = 5000 # Max num. of lines held between flushes, older lines are dropped first
+
 CL_TYPE_NONE = -1
 CL_TYPE_PLAYER = 0
 CL_TYPE_CONTINENT = 1
@@ -58,6 +107,91 @@ MID_GAME = 0
 CARDS_REDEEMED_LATE_GAME = 5
 
 
+# Call counts and timings of functions wrapped with @profiled, printed when the game ends.
+class Profiler():
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+
+    def record(self, name: str, seconds: float):
+        self.samples[name].append(seconds)
+
+    def get_percentile(self, samples: list[float], percentile: float) -> float:
+        return samples[min(len(samples) - 1, int(len(samples) * percentile))]
+
+    def print_summary(self):
+        print('%-36s %8s %10s %10s %10s %10s %10s' % ('span', 'count', 'total ms', 'mean ms', 'p50 ms', 'p95 ms', 'max ms'), flush=True)
+        for name, samples in sorted(self.samples.items(), key=lambda x: sum(x[1]), reverse=True):
+            samples = sorted(samples)
+            print('%-36s %8d %10.1f %10.3f %10.3f %10.3f %10.3f' % (
+                name, len(samples), 1000 * sum(samples), 1000 * sum(samples) / len(samples),
+                1000 * self.get_percentile(samples, 0.5), 1000 * self.get_percentile(samples, 0.95), 1000 * samples[-1]
+            ), flush=True)
+
+profiler = Profiler()
+if PROFILE_ENABLED:
+    atexit.register(profiler.print_summary)
+
+# Debug output kept in a ring buffer and written in one go at the end of our turn (or on a crash),
+# so the hot path never waits on stdout.
+class Logger():
+    def __init__(self, level: int, max_lines: int):
+        self.level: int = level
+        self.lines: deque[str] = deque(maxlen=max_lines)
+        self.dropped: int = 0
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    # logger.debug('troops: %d', x) is formatted like 'troops: %d' % x, but only once the level passes.
+    # Anything else is joined like print(a, b, c) would.
+    def log(self, level: int, *args):
+        if level < self.level:
+            return
+        if len(self.lines) == self.lines.maxlen:
+            self.dropped += 1
+        if len(args) > 1 and isinstance(args[0], str) and '%' in args[0]:
+            self.lines.append(args[0] % args[1:])
+        else:
+            self.lines.append(' '.join(str(x) for x in args))
+
+    def debug(self, *args):
+        self.log(LOG_DEBUG, *args)
+
+    def info(self, *args):
+        self.log(LOG_INFO, *args)
+
+    def warning(self, *args):
+        self.log(LOG_WARNING, *args)
+
+    def flush(self):
+        if len(self.lines) == 0:
+            return
+        if self.dropped > 0:
+            sys.stdout.write('... %d earlier lines dropped\n' % self.dropped)
+        sys.stdout.write('\n'.join(self.lines) + '\n')
+        sys.stdout.flush()
+        self.lines.clear()
+        self.dropped = 0
+
+logger = Logger(LOG_LEVEL, LOG_BUFFER_SIZE)
+atexit.register(logger.flush)
+
+# Times every call of the wrapped function under name. Disabled, it returns the function untouched.
+def profiled(name: str):
+    def decorator(func):
+        if not PROFILE_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(name, perf_counter() - start)
+        return wrapper
+    return decorator
+
 # We will store our enemy in the bot state.
 class BotState():
     def __init__(self):
@@ -76,19 +210,963 @@ class TargetCluster():
         self.attacker: int = attacker
         self.difficulty_score: int = score
         self.recommended_troops: int = recommended_troops
-        #self.wc_remmmended_troops: int = 0
         self.commit: bool = False
         self.type: int = type # 0: player, 1: continent
         self.continent: int = NOT_FOUND
 
+# Everything about the map that never changes during a game, computed once at startup.
+# With 42 territories every territory set fits in a single int (bit i set <=> territory i in set),
+# so intersections, unions and membership tests become single integer ops.
+class StaticMap():
+    def __init__(self, game: Game):
+        self.map = game.state.map
+        self.territory_count: int = len(game.state.territories)
+        self.all: int = (1 << self.territory_count) - 1
+        self.adjacent_list: list[tuple[int, ...]] = [tuple(game.state.map.get_adjacent_to(t)) for t in range(self.territory_count)]
+        self.adjacent: list[int] = [to_mask(x) for x in self.adjacent_list]
+        self.continent: dict[int, int] = {cont: to_mask(territories) for cont, territories in game.state.map.get_continents().items()}
+        self.territory_continent: list[int] = [NOT_FOUND] * self.territory_count
+        for cont, cont_mask in self.continent.items():
+            for territory in from_mask(cont_mask):
+                self.territory_continent[territory] = cont
+
+        # in-choke: continent territories bordering another continent, out-choke: the territories they border
+        self.in_choke: dict[int, int] = {cont: self.get_border_mask(cont_mask) for cont, cont_mask in self.continent.items()}
+        self.out_choke: dict[int, int] = {cont: self.get_adjacent_mask(cont_mask) for cont, cont_mask in self.continent.items()}
+
+        # distance[a][b]: hops between a and b, next_hop[a][b]: neighbour of a on a shortest path to b
+        self.distance: list[list[int]] = [[INF_INT] * self.territory_count for _ in range(self.territory_count)]
+        self.next_hop: list[list[int]] = [[NOT_FOUND] * self.territory_count for _ in range(self.territory_count)]
+        for target in range(self.territory_count):
+            self.distance[target][target] = 0
+            queue = deque([target])
+            while queue:
+                current = queue.popleft()
+                for neighbour in self.adjacent_list[current]:
+                    if self.distance[neighbour][target] == INF_INT:
+                        self.distance[neighbour][target] = self.distance[current][target] + 1
+                        self.next_hop[neighbour][target] = current
+                        queue.append(neighbour)
+
+        # Cut nodes only depend on which territories are in the cluster, so a cluster mask is a complete cache key
+        self.cut_cache: dict[int, int] = {}
+        self.attack_order_cache: dict[tuple[int, int], tuple[int, ...]] = {}
+
+    def get_adjacent_mask(self, mask: int) -> int:
+        """Territories adjacent to any territory in mask, excluding mask itself."""
+        result = 0
+        remaining = mask
+        while remaining:
+            low = remaining & -remaining
+            result |= self.adjacent[low.bit_length() - 1]
+            remaining ^= low
+        return result & ~mask
+
+    def get_border_mask(self, mask: int) -> int:
+        """Territories in mask that are adjacent to a territory outside of mask."""
+        result = 0
+        remaining = mask
+        while remaining:
+            low = remaining & -remaining
+            territory = low.bit_length() - 1
+            if self.adjacent[territory] & ~mask:
+                result |= low
+            remaining ^= low
+        return result
+
+    @profiled('StaticMap.get_cut_mask')
+    def get_cut_mask(self, cluster_mask: int) -> int:
+        """Articulation points of the subgraph induced by cluster_mask, classified in one DFS (Tarjan)."""
+        cut_mask = self.cut_cache.get(cluster_mask)
+        if cut_mask != None:
+            return cut_mask
+
+        discovery: dict[int, int] = {}
+        low: dict[int, int] = {}
+        cut_mask = 0
+        unseen = cluster_mask
+        while unseen:
+            root = (unseen & -unseen).bit_length() - 1
+            unseen &= ~(1 << root)
+            discovery[root] = low[root] = len(discovery)
+            root_children = 0
+            stack = [(root, NOT_FOUND, iter(from_mask(self.adjacent[root] & cluster_mask)))]
+
+            while stack:
+                node, parent, neighbours = stack[-1]
+                for neighbour in neighbours:
+                    if neighbour not in discovery:
+                        unseen &= ~(1 << neighbour)
+                        discovery[neighbour] = low[neighbour] = len(discovery)
+                        stack.append((neighbour, node, iter(from_mask(self.adjacent[neighbour] & cluster_mask))))
+                        break
+                    if neighbour != parent:
+                        low[node] = min(low[node], discovery[neighbour])
+                else:
+                    # All neighbours explored, report low link back to the parent
+                    stack.pop()
+                    if parent == root:
+                        root_children += 1
+                    elif parent != NOT_FOUND and low[node] >= discovery[parent]:
+                        cut_mask |= 1 << parent
+                    if parent != NOT_FOUND:
+                        low[parent] = min(low[parent], low[node])
+
+            if root_children > 1:
+                cut_mask |= 1 << root
+
+        if len(self.cut_cache) >= CUT_CACHE_SIZE:
+            self.cut_cache.clear()
+        self.cut_cache[cluster_mask] = cut_mask
+        return cut_mask
+
+    def get_attack_order(self, cluster_mask: int, attacker: int) -> tuple[int, ...]:
+        """Order handle_attack conquers cluster_mask in, following the stack from attacker:
+        non cut nodes first, then the ones with the fewest links into the rest of the cluster."""
+        key = (cluster_mask, attacker)
+        order = self.attack_order_cache.get(key)
+        if order != None:
+            return order
+
+        remaining_mask = cluster_mask
+        reached_mask = 0 if attacker == NOT_FOUND else 1 << attacker
+        current = attacker
+        result: list[int] = []
+        while remaining_mask:
+            candidates_mask = 0 if current == NOT_FOUND else self.adjacent[current] & remaining_mask
+            if candidates_mask == 0:
+                # Stack got cut off, carry on from anything already reached
+                candidates_mask = self.get_adjacent_mask(reached_mask) & remaining_mask or remaining_mask
+            if candidates_mask & (candidates_mask - 1):
+                cut_mask = self.get_cut_mask(remaining_mask)
+                current = min(from_mask(candidates_mask), key=lambda x: (cut_mask >> x & 1, (self.adjacent[x] & remaining_mask).bit_count(), x))
+            else:
+                current = candidates_mask.bit_length() - 1
+            result.append(current)
+            remaining_mask &= ~(1 << current)
+            reached_mask |= 1 << current
+
+        order = tuple(result)
+        if len(self.attack_order_cache) >= CUT_CACHE_SIZE:
+            self.attack_order_cache.clear()
+        self.attack_order_cache[key] = order
+        return order
+
+# Ownership, troops and borders for every player, built once per query and shared by all handlers and helpers.
+# The board only changes when new records arrive, so it is rebuilt only when game.state.recording grows.
+class BoardSnapshot():
+    def __init__(self, game: Game):
+        static_map = get_static_map(game)
+        self.state = game.state
+        self.recording_len: int = len(game.state.recording)
+        self.me: int = game.state.me.player_id
+
+        self.owner: list[Optional[int]] = []
+        self.troops: list[int] = []
+        self.owned_mask: dict[Optional[int], int] = defaultdict(lambda: 0)
+        self.troop_total: dict[Optional[int], int] = defaultdict(lambda: 0)
+        for territory in range(static_map.territory_count):
+            territory_model = game.state.territories[territory]
+            self.owner.append(territory_model.occupier)
+            self.troops.append(territory_model.troops)
+            self.owned_mask[territory_model.occupier] |= 1 << territory
+            self.troop_total[territory_model.occupier] += territory_model.troops
+
+        self.owned: dict[Optional[int], list[int]] = {player: from_mask(mask) for player, mask in self.owned_mask.items()}
+        self.border_mask: dict[Optional[int], int] = {player: static_map.get_border_mask(mask) for player, mask in self.owned_mask.items()}
+        self.border: dict[Optional[int], list[int]] = {player: from_mask(mask) for player, mask in self.border_mask.items()}
+        # Path weights only depend on which territories are ours and the troops on everything else
+        self.enemy_troops: tuple[int, ...] = tuple(0 if self.owner[x] == self.me else self.troops[x] for x in range(static_map.territory_count))
+        # Cost of taking each territory on a path, 0 for ours (see get_territory_weight_wrt_cluster)
+        self.path_weights: list[int] = [0 if self.owner[x] == self.me else (1 if self.troops[x] == 1 else self.troops[x] + 1) for x in range(static_map.territory_count)]
+
+    def get_owned(self, player_id: Optional[int]) -> list[int]:
+        return self.owned.get(player_id, [])
+
+    def get_border(self, player_id: Optional[int]) -> list[int]:
+        return self.border.get(player_id, [])
+
+# Time budget for answering the current query, restarted by begin_query.
+class Deadline():
+    def __init__(self, budget: float):
+        self.budget: float = budget
+        self.start_time: float = perf_counter()
+        self.degraded: int = 0 # Num. of stages that fell back to a cheaper heuristic this query
+
+    def start(self):
+        self.start_time = perf_counter()
+        self.degraded = 0
+
+    def elapsed(self) -> float:
+        return perf_counter() - self.start_time
+
+    def remaining(self) -> float:
+        return self.budget - self.elapsed()
+
+    def is_near(self) -> bool:
+        return self.remaining() < self.budget * DEADLINE_MARGIN
+
+    # Checked before an optional stage, True if it should be skipped
+    def should_degrade(self, stage: str) -> bool:
+        if not self.is_near():
+            return False
+        self.degraded += 1
+        logger.warning('Deadline near (%.3fs left), degrading: %s', self.remaining(), stage)
+        return True
+
+# Bounded LRU cache of path search results, evicting the least recently used entry once full.
+class PathCache():
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self.entries: OrderedDict[tuple, dict[int, tuple[list[int], int]]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: tuple) -> Optional[dict[int, tuple[list[int], int]]]:
+        result = self.entries.get(key)
+        if result == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key: tuple, result: dict[int, tuple[list[int], int]]):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+path_cache = PathCache(PATH_CACHE_SIZE)
+
+board_snapshot: Optional[BoardSnapshot] = None
+
+def get_snapshot(game: Game) -> BoardSnapshot:
+    global board_snapshot
+    if board_snapshot is None or board_snapshot.state is not game.state or board_snapshot.recording_len != len(game.state.recording):
+        board_snapshot = BoardSnapshot(game)
+    return board_snapshot
+
+# Records that never change a territory's owner or troops
+PASSIVE_RECORD_TYPES = {
+    "start_game", "start_turn", "player_eliminated", "drew_card", "shuffled_cards", "move_redeem_cards",
+    "move_attack", "move_attack_pass", "move_defend", "move_fortify_pass",
+}
+
+# Territories record changed, or None if we can't tell
+def get_record_territories(record, recording: list) -> Optional[list[int]]:
+    match record.record_type:
+        case "move_claim_territory" | "move_place_initial_troop":
+            return [record.territory]
+        case "move_distribute_troops":
+            return [int(x) for x in record.distributions]
+        case "attack":
+            move_attack = recording[record.move_attack_id]
+            return [move_attack.attacking_territory, move_attack.defending_territory]
+        case "move_troops_after_attack":
+            move_attack = recording[recording[record.record_attack_id].move_attack_id]
+            return [move_attack.attacking_territory, move_attack.defending_territory]
+        case "move_fortify":
+            return [record.source_territory, record.target_territory]
+    return [] if record.record_type in PASSIVE_RECORD_TYPES else None
+
+# Territories and troops each player holds in each continent, kept up to date from the records added since the last
+# query instead of rescanning the board. Only territories a new record touched are re-read from game.state, and a
+# record we don't recognise triggers a full rescan, so the counters can't drift from the board.
+class ContinentCounters():
+    def __init__(self, game: Game):
+        static_map = get_static_map(game)
+        self.state = game.state
+        self.territory_continent: list[int] = static_map.territory_continent
+        self.continent_size: dict[int, int] = {cont: cont_mask.bit_count() for cont, cont_mask in static_map.continent.items()}
+        self.records_seen: int = 0
+        self.owner: list[Optional[int]] = [None] * static_map.territory_count
+        self.troops: list[int] = [0] * static_map.territory_count
+        # territory_count[cont][player], troop_sum[cont][player], players without territories in cont are left out
+        self.territory_count: dict[int, dict[int, int]] = {cont: {} for cont in static_map.continent}
+        self.troop_sum: dict[int, dict[int, int]] = {cont: {} for cont in static_map.continent}
+        self.rescan()
+
+    def rescan(self):
+        for territory in range(len(self.owner)):
+            self.update_territory(territory)
+        self.records_seen = len(self.state.recording)
+
+    def sync(self):
+        recording = self.state.recording
+        touched: set[int] = set()
+        for x in range(self.records_seen, len(recording)):
+            territories = get_record_territories(recording[x], recording)
+            if territories == None:
+                self.rescan()
+                return
+            touched.update(territories)
+        for territory in touched:
+            self.update_territory(territory)
+        self.records_seen = len(recording)
+
+    # Moves territory's old owner and troops out of the counters and its current ones in
+    def update_territory(self, territory: int):
+        territory_model = self.state.territories[territory]
+        cont = self.territory_continent[territory]
+        old_owner = self.owner[territory]
+        if old_owner != None:
+            self.add(cont, old_owner, -1, -self.troops[territory])
+        self.owner[territory] = territory_model.occupier
+        self.troops[territory] = territory_model.troops
+        if territory_model.occupier != None:
+            self.add(cont, territory_model.occupier, 1, territory_model.troops)
+
+    def add(self, cont: int, player: int, territories: int, troops: int):
+        count = self.territory_count[cont].get(player, 0) + territories
+        if count == 0:
+            del self.territory_count[cont][player]
+            del self.troop_sum[cont][player]
+        else:
+            self.territory_count[cont][player] = count
+            self.troop_sum[cont][player] = self.troop_sum[cont].get(player, 0) + troops
+
+    def get_territory_count(self, player: int, cont: int) -> int:
+        return self.territory_count[cont].get(player, 0)
+
+    def get_troops(self, player: int, cont: int) -> int:
+        return self.troop_sum[cont].get(player, 0)
+
+    def get_percent_owned(self, player: int, cont: int) -> float:
+        return self.territory_count[cont].get(player, 0) / self.continent_size[cont]
+
+    def get_players(self, cont: int) -> set[int]:
+        return set(self.territory_count[cont])
+
+    # Continents where player holds at least one territory
+    def get_continents(self, player: int) -> list[int]:
+        return [cont for cont, counts in self.territory_count.items() if player in counts]
+
+continent_counters: Optional[ContinentCounters] = None
+
+def get_continent_counters(game: Game) -> ContinentCounters:
+    global continent_counters
+    if continent_counters is None or continent_counters.state is not game.state:
+        continent_counters = ContinentCounters(game)
+    elif continent_counters.records_seen != len(game.state.recording):
+        continent_counters.sync()
+    return continent_counters
+
+# Troops the card set redeemed after sets_redeemed others is worth
+def get_card_set_value(sets_redeemed: int) -> int:
+    if sets_redeemed < len(CARD_SET_VALUES):
+        return CARD_SET_VALUES[sets_redeemed]
+    return CARD_SET_VALUES[-1] + CARD_SET_INCREMENT * (sets_redeemed - len(CARD_SET_VALUES) + 1)
+
+# Cards each player holds, kept up to date from the records added since the last query. Draws add a card, redeemed sets
+# take 3 away and an eliminated player's hand goes to whoever eliminated them. Only record fields every player can see are
+# read, and the counts start from game.state so a tracker made mid-game is right from the start.
+class CardCounters():
+    def __init__(self, game: Game):
+        self.state = game.state
+        self.records_seen: int = 0
+        self.card_count: dict[int, int] = {}
+        self.card_sets_redeemed: int = 0
+        self.rescan()
+
+    def rescan(self):
+        self.card_count = {player.player_id: player.card_count for player in self.state.players.values()}
+        self.card_sets_redeemed = self.state.card_sets_redeemed
+        self.records_seen = len(self.state.recording)
+
+    def sync(self):
+        recording = self.state.recording
+        for x in range(self.records_seen, len(recording)):
+            record = recording[x]
+            match record.record_type:
+                case "drew_card":
+                    self.card_count[record.player] += 1
+                case "move_redeem_cards":
+                    self.card_count[record.move_by_player] -= 3 * len(record.sets)
+                    self.card_sets_redeemed += len(record.sets)
+                case "player_eliminated":
+                    move_attack = recording[recording[record.record_attack_id].move_attack_id]
+                    self.card_count[move_attack.move_by_player] += self.card_count[record.player]
+                    self.card_count[record.player] = 0
+        self.records_seen = len(recording)
+
+    def get_card_count(self, player: int) -> int:
+        return self.card_count[player]
+
+    # Troops from the first count card sets redeemed from now on
+    def get_sets_value(self, count: int) -> int:
+        return sum(get_card_set_value(self.card_sets_redeemed + x) for x in range(count))
+
+    # Troops player is sure to get from cards on their next turn, assuming nobody redeems before them
+    def get_next_redemption_value(self, player: int) -> int:
+        return self.get_sets_value(get_guaranteed_sets(self.card_count[player]))
+
+    # Troops eliminating player is worth to me in cards: the sets their hand adds to mine, redeemable straight away,
+    # plus the redemption they won't get to make
+    def get_elimination_value(self, me: int, player: int) -> int:
+        my_sets = get_guaranteed_sets(self.card_count[me])
+        gained_sets = get_guaranteed_sets(self.card_count[me] + self.card_count[player]) - my_sets
+        return self.get_sets_value(my_sets + gained_sets) - self.get_sets_value(my_sets) + self.get_next_redemption_value(player)
+
+card_counters: Optional[CardCounters] = None
+
+def get_card_counters(game: Game) -> CardCounters:
+    global card_counters
+    if card_counters is None or card_counters.state is not game.state:
+        card_counters = CardCounters(game)
+    elif card_counters.records_seen != len(game.state.recording):
+        card_counters.sync()
+    return card_counters
+
+# Probability of each (attacker lost, defender lost) result for a single roll of attack_dice vs. defend_dice.
+def get_roll_outcomes(attack_dice: int, defend_dice: int) -> dict[tuple[int, int], float]:
+    outcomes: dict[tuple[int, int], float] = defaultdict(lambda: 0.0)
+    roll_count = 6 ** (attack_dice + defend_dice)
+    for roll in itertools.product(range(1, 7), repeat=attack_dice + defend_dice):
+        attack_roll = sorted(roll[:attack_dice], reverse=True)
+        defend_roll = sorted(roll[attack_dice:], reverse=True)
+        attacker_lost = 0
+        defender_lost = 0
+        for a, d in zip(attack_roll, defend_roll):
+            if a > d:
+                defender_lost += 1
+            else:
+                attacker_lost += 1
+        outcomes[(attacker_lost, defender_lost)] += 1 / roll_count
+    return dict(outcomes)
+
+# Exact odds of a whole battle, attacking with max dice until the defender falls or we can't attack anymore.
+# Tables are indexed [a][d], a = troops able to attack (territory troops - 1), d = defending troops.
+class BattleTable():
+    def __init__(self, cap: int):
+        self.cap: int = cap
+        roll_outcomes = {(a, d): list(get_roll_outcomes(a, d).items()) for a in range(1, 4) for d in range(1, 3)}
+
+        self.win: list[list[float]] = [[0.0] * (cap + 1) for _ in range(cap + 1)]
+        self.attacker_losses: list[list[float]] = [[0.0] * (cap + 1) for _ in range(cap + 1)]
+        self.defender_losses: list[list[float]] = [[0.0] * (cap + 1) for _ in range(cap + 1)]
+        # Every roll loses at least one troop, so [a][d] only depends on entries before it in this order
+        for a in range(cap + 1):
+            for d in range(cap + 1):
+                if d == 0:
+                    self.win[a][d] = 1.0
+                    continue
+                if a == 0:
+                    continue
+                for (attacker_lost, defender_lost), p in roll_outcomes[(min(3, a), min(2, d))]:
+                    next_a = a - attacker_lost
+                    next_d = d - defender_lost
+                    self.win[a][d] += p * self.win[next_a][next_d]
+                    self.attacker_losses[a][d] += p * (attacker_lost + self.attacker_losses[next_a][next_d])
+                    self.defender_losses[a][d] += p * (defender_lost + self.defender_losses[next_a][next_d])
+
+    # Territory troop counts to table indices, scaling both sides down together past the cap
+    def get_index(self, attacker_troops: int, defender_troops: int) -> tuple[int, int]:
+        a = max(attacker_troops - 1, 0)
+        d = max(defender_troops, 0)
+        if a > self.cap or d > self.cap:
+            scale = self.cap / max(a, d)
+            a = round(a * scale)
+            d = round(d * scale)
+        return a, d
+
+    def get_win_probability(self, attacker_troops: int, defender_troops: int) -> float:
+        a, d = self.get_index(attacker_troops, defender_troops)
+        return self.win[a][d]
+
+    def get_expected_attacker_losses(self, attacker_troops: int, defender_troops: int) -> float:
+        a, d = self.get_index(attacker_troops, defender_troops)
+        return self.attacker_losses[a][d]
+
+    def get_expected_defender_losses(self, attacker_troops: int, defender_troops: int) -> float:
+        a, d = self.get_index(attacker_troops, defender_troops)
+        return self.defender_losses[a][d]
+
+battle_table = BattleTable(BATTLE_TABLE_CAP)
+
+# Expected cost of conquering territories one after another with a single stack, the way handle_attack sweeps a cluster.
+# Each conquest leaves one troop behind and moves the rest forward, so the stack shrinks by the expected losses + 1.
+class SweepEstimator():
+    def __init__(self, table: BattleTable, max_size: int):
+        self.table: BattleTable = table
+        self.max_size: int = max_size
+        self.sweep_cache: dict[tuple[int, tuple[int, ...]], float] = {}
+        self.needed_cache: dict[tuple[int, ...], int] = {}
+
+    # Expected troops on the last conquered territory, 0 if some battle falls below SWEEP_MIN_WIN_PROB on the way
+    def estimate_sweep(self, attacker_troops: int, defender_troops: tuple[int, ...]) -> float:
+        key = (attacker_troops, defender_troops)
+        result = self.sweep_cache.get(key)
+        if result != None:
+            return result
+
+        stack = float(attacker_troops)
+        for troops in defender_troops:
+            a = round(stack)
+            if a <= 1 or self.table.get_win_probability(a, troops) < SWEEP_MIN_WIN_PROB:
+                stack = 0.0
+                break
+            stack -= self.table.get_expected_attacker_losses(a, troops) + 1
+
+        if len(self.sweep_cache) >= self.max_size:
+            self.sweep_cache.clear()
+        self.sweep_cache[key] = stack
+        return stack
+
+    # Fewest troops the attacking territory needs to sweep defender_troops in order
+    def get_troops_needed(self, defender_troops: tuple[int, ...]) -> int:
+        result = self.needed_cache.get(defender_troops)
+        if result != None:
+            return result
+
+        # More troops never make a sweep less likely, so binary search the smallest stack that gets through
+        low = 1
+        high = 2
+        while high < SWEEP_MAX_TROOPS and self.estimate_sweep(high, defender_troops) < 1:
+            low = high
+            high = min(high * 2, SWEEP_MAX_TROOPS)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.estimate_sweep(middle, defender_troops) < 1:
+                low = middle
+            else:
+                high = middle
+
+        if len(self.needed_cache) >= self.max_size:
+            self.needed_cache.clear()
+        self.needed_cache[defender_troops] = high
+        return high
+
+sweep_estimator = SweepEstimator(battle_table, SWEEP_CACHE_SIZE)
+
+# Plays out many sweeps at once with real dice, attacking like attempt_attack does and moving all but one troop forward.
+# A plan is (attacker troops, defender troops in attack order), the result is the fraction of playouts that took everything.
+class SweepSimulator():
+    def __init__(self, table: BattleTable):
+        # keep_attacking[t][d]: attempt_attack still attacks with t territory troops against d, counts past the cap are clipped
+        self.cap: int = table.cap
+        self.keep_attacking: list[list[bool]] = [
+            [t > 1 and table.get_win_probability(t, d) >= MIN_ATK_WIN_PROB for d in range(self.cap + 1)]
+            for t in range(self.cap + 2)
+        ]
+        self.keep_attacking_array = None if np is None else np.array(self.keep_attacking, dtype=bool)
+
+    def simulate(self, plans: list[tuple[int, tuple[int, ...]]], seed: int) -> list[float]:
+        if len(plans) == 0:
+            return []
+        if np is None:
+            return self.simulate_python(plans, SIMULATION_SAMPLES_FALLBACK, seed)
+        return self.simulate_numpy(plans, SIMULATION_SAMPLES, seed)
+
+    def simulate_numpy(self, plans: list[tuple[int, tuple[int, ...]]], samples: int, seed: int) -> list[float]:
+        rng = np.random.default_rng(seed)
+        # One row per playout, defenders padded with 0 so looking one past the last territory is safe
+        defenders = np.zeros((len(plans), max(len(x[1]) for x in plans) + 1), dtype=np.int64)
+        for i, (_, defender_troops) in enumerate(plans):
+            defenders[i, :len(defender_troops)] = defender_troops
+        row_plan = np.repeat(np.arange(len(plans)), samples)
+        lengths = np.repeat(np.array([len(x[1]) for x in plans], dtype=np.int64), samples)
+        attacker = np.repeat(np.array([x[0] for x in plans], dtype=np.int64), samples)
+        defender = defenders[row_plan, 0]
+        position = np.zeros(len(row_plan), dtype=np.int64)
+        success = lengths == 0
+        active = ~success
+        dice_slots = np.arange(3)
+
+        while active.any():
+            rows = np.flatnonzero(active)
+            a = attacker[rows]
+            d = defender[rows]
+            keep = self.keep_attacking_array[np.minimum(a, self.cap + 1), np.minimum(d, self.cap)]
+            active[rows[~keep]] = False
+            rows, a, d = rows[keep], a[keep], d[keep]
+            if len(rows) == 0:
+                break
+
+            # Unused dice roll 0 so they sort to the bottom and never win a comparison
+            attack_dice = np.minimum(a - 1, 3)
+            defend_dice = np.minimum(d, 2)
+            attack_roll = rng.integers(1, 7, size=(len(rows), 3))
+            attack_roll[dice_slots >= attack_dice[:, None]] = 0
+            attack_roll.sort(axis=1)
+            defend_roll = rng.integers(1, 7, size=(len(rows), 2))
+            defend_roll[dice_slots[:2] >= defend_dice[:, None]] = 0
+            defend_roll.sort(axis=1)
+
+            first_won = attack_roll[:, 2] > defend_roll[:, 1]
+            second_fought = (attack_dice >= 2) & (defend_dice >= 2)
+            second_won = attack_roll[:, 1] > defend_roll[:, 0]
+            a = a - ~first_won - (second_fought & ~second_won)
+            d = d - first_won - (second_fought & second_won)
+
+            conquered = d == 0
+            position[rows] += conquered
+            a = np.where(conquered, a - 1, a)
+            d = np.where(conquered, defenders[row_plan[rows], position[rows]], d)
+            attacker[rows] = a
+            defender[rows] = d
+            finished = rows[conquered & (position[rows] >= lengths[rows])]
+            success[finished] = True
+            active[finished] = False
+
+        return success.reshape(len(plans), samples).mean(axis=1).tolist()
+
+    def simulate_python(self, plans: list[tuple[int, tuple[int, ...]]], samples: int, seed: int) -> list[float]:
+        rng = random.Random(seed)
+        result = []
+        for attacker_troops, defender_troops in plans:
+            successes = 0
+            for _ in range(samples):
+                a = attacker_troops
+                for d in defender_troops:
+                    while d > 0 and self.keep_attacking[min(a, self.cap + 1)][min(d, self.cap)]:
+                        attack_roll = sorted((rng.randint(1, 6) for _ in range(min(a - 1, 3))), reverse=True)
+                        defend_roll = sorted((rng.randint(1, 6) for _ in range(min(d, 2))), reverse=True)
+                        for attack_die, defend_die in zip(attack_roll, defend_roll):
+                            if attack_die > defend_die:
+                                d -= 1
+                            else:
+                                a -= 1
+                    if d > 0:
+                        break
+                    a -= 1
+                else:
+                    successes += 1
+            result.append(successes / samples)
+        return result
+
+sweep_simulator = SweepSimulator(battle_table)
+
+# Board, cards and per-player totals in a few flat lists, for searches that copy the board many times.
+# Clones share their lists with the original and copy a list only when they first write to it,
+# so a clone that only changes troops never copies owners. Unclaimed territories are owned by NOT_FOUND.
+class CompactState():
+    __slots__ = ("owner", "troops", "player_troops", "player_territories", "player_cards", "card_sets_redeemed", "captures",
+                 "owner_shared", "troops_shared", "players_shared")
+
+    def __init__(self, owner: list[int], troops: list[int], player_troops: list[int], player_territories: list[int], player_cards: list[int], card_sets_redeemed: int):
+        self.owner: list[int] = owner
+        self.troops: list[int] = troops
+        self.player_troops: list[int] = player_troops # Troops on the board per player id
+        self.player_territories: list[int] = player_territories # Territories held per player id
+        self.player_cards: list[int] = player_cards # Cards in hand per player id
+        self.card_sets_redeemed: int = card_sets_redeemed
+        self.captures: int = 0 # Territories taken since the state was built from the game
+        self.owner_shared: bool = False
+        self.troops_shared: bool = False
+        self.players_shared: bool = False
+
+    @staticmethod
+    def from_game(game: Game) -> 'CompactState':
+        player_count = max(game.state.players) + 1
+        owner: list[int] = []
+        troops: list[int] = []
+        player_troops = [0] * player_count
+        player_territories = [0] * player_count
+        for territory in range(len(game.state.territories)):
+            territory_model = game.state.territories[territory]
+            occupier = NOT_FOUND if territory_model.occupier == None else territory_model.occupier
+            owner.append(occupier)
+            troops.append(territory_model.troops)
+            if occupier != NOT_FOUND:
+                player_troops[occupier] += territory_model.troops
+                player_territories[occupier] += 1
+        player_cards = [0] * player_count
+        for player in game.state.players.values():
+            player_cards[player.player_id] = player.card_count
+        return CompactState(owner, troops, player_troops, player_territories, player_cards, game.state.card_sets_redeemed)
+
+    def clone(self) -> 'CompactState':
+        state = CompactState(self.owner, self.troops, self.player_troops, self.player_territories, self.player_cards, self.card_sets_redeemed)
+        state.captures = self.captures
+        # Both sides now share every list, whichever writes first takes a copy
+        self.owner_shared = self.troops_shared = self.players_shared = True
+        state.owner_shared = state.troops_shared = state.players_shared = True
+        return state
+
+    def write_owner(self) -> list[int]:
+        if self.owner_shared:
+            self.owner = self.owner[:]
+            self.owner_shared = False
+        return self.owner
+
+    def write_troops(self) -> list[int]:
+        if self.troops_shared:
+            self.troops = self.troops[:]
+            self.troops_shared = False
+        return self.troops
+
+    def write_players(self):
+        if self.players_shared:
+            self.player_troops = self.player_troops[:]
+            self.player_territories = self.player_territories[:]
+            self.player_cards = self.player_cards[:]
+            self.players_shared = False
+
+    def place_troops(self, territory: int, count: int):
+        self.write_troops()[territory] += count
+        self.write_players()
+        self.player_troops[self.owner[territory]] += count
+
+    def apply_battle(self, attacker: int, target: int, attacker_lost: int, defender_lost: int):
+        troops = self.write_troops()
+        troops[attacker] -= attacker_lost
+        troops[target] -= defender_lost
+        self.write_players()
+        self.player_troops[self.owner[attacker]] -= attacker_lost
+        self.player_troops[self.owner[target]] -= defender_lost
+
+    # Takes the emptied target for attacker's owner and moves count troops in, True if that eliminated the previous owner
+    def capture(self, attacker: int, target: int, count: int) -> bool:
+        player = self.owner[attacker]
+        previous_owner = self.owner[target]
+        self.write_owner()[target] = player
+        troops = self.write_troops()
+        troops[attacker] -= count
+        troops[target] += count
+        self.write_players()
+        self.player_territories[player] += 1
+        self.player_territories[previous_owner] -= 1
+        self.captures += 1
+        if self.player_territories[previous_owner] == 0:
+            # Eliminating a player hands us their cards
+            self.player_cards[player] += self.player_cards[previous_owner]
+            self.player_cards[previous_owner] = 0
+            return True
+        return False
+
+    def move_troops(self, source: int, target: int, count: int):
+        troops = self.write_troops()
+        troops[source] -= count
+        troops[target] += count
+
+    def draw_card(self, player: int):
+        self.write_players()
+        self.player_cards[player] += 1
+
+    def redeem_cards(self, player: int):
+        self.write_players()
+        self.player_cards[player] -= 3
+        self.card_sets_redeemed += 1
+
+# Decides between attacking target now and passing by playing the rest of the turn out many times with real dice.
+# After the first roll, rollouts attack like attempt_attack and follow the handle_attack sweep through the cluster.
+class RolloutSearch():
+    def __init__(self, game: Game, captured_this_turn: bool):
+        bonuses = game.state.map.get_continent_bonuses()
+        self.static_map: StaticMap = get_static_map(game)
+        self.me: int = game.state.me.player_id
+        self.root: CompactState = CompactState.from_game(game)
+        self.root_eliminated: int = self.root.player_territories.count(0)
+        self.captured_this_turn: bool = captured_this_turn
+        self.continent_bonus: list[tuple[int, int]] = [(cont_mask, bonuses[cont]) for cont, cont_mask in self.static_map.continent.items()]
+
+    # Our troops, a few turns of income and the card, less enemy troops and what adjacent enemies could take back, in troops
+    def evaluate(self, state: CompactState) -> float:
+        owner = state.owner
+        troops = state.troops
+        owned_mask = 0
+        exposure = 0.0
+        for territory in range(len(owner)):
+            if owner[territory] != self.me:
+                continue
+            owned_mask |= 1 << territory
+            threat = 0
+            for neighbour in self.static_map.adjacent_list[territory]:
+                if owner[neighbour] != self.me and troops[neighbour] > threat:
+                    threat = troops[neighbour]
+            if threat > 1:
+                exposure += troops[territory] * battle_table.get_win_probability(threat, troops[territory])
+
+        # Territories count fractionally, so every capture is worth something and not only every third one
+        income = state.player_territories[self.me] / 3 + sum(bonus for cont_mask, bonus in self.continent_bonus if owned_mask & cont_mask == cont_mask)
+        troop_total = state.player_troops[self.me]
+        enemy_troop_total = sum(state.player_troops) - troop_total
+        eliminations = state.player_territories.count(0) - self.root_eliminated
+        value = troop_total - ROLLOUT_ENEMY_TROOP_WEIGHT * enemy_troop_total + ROLLOUT_INCOME_TURNS * income
+        value += ROLLOUT_ELIMINATION_VALUE * eliminations - ROLLOUT_EXPOSURE_WEIGHT * exposure
+        if state.captures > 0 and not self.captured_this_turn:
+            value += ROLLOUT_CARD_VALUE
+        return value
+
+    # Rolls attacker against target while attempt_attack would (always once if forced), True if target was taken
+    def fight(self, state: CompactState, attacker: int, target: int, rng: random.Random, forced: bool) -> bool:
+        keep_attacking = sweep_simulator.keep_attacking
+        cap = sweep_simulator.cap
+        a_start = a = state.troops[attacker]
+        d_start = d = state.troops[target]
+        while d > 0 and a > 1 and (forced or keep_attacking[min(a, cap + 1)][min(d, cap)]):
+            forced = False
+            attack_roll = sorted((rng.randint(1, 6) for _ in range(min(a - 1, 3))), reverse=True)
+            defend_roll = sorted((rng.randint(1, 6) for _ in range(min(d, 2))), reverse=True)
+            for attack_die, defend_die in zip(attack_roll, defend_roll):
+                if attack_die > defend_die:
+                    d -= 1
+                else:
+                    a -= 1
+
+        state.apply_battle(attacker, target, a_start - a, d_start - d)
+        if d > 0:
+            return False
+        # Move everything but one troop forward, like handle_troops_after_attack does for cluster attacks
+        state.capture(attacker, target, a - 1)
+        return True
+
+    def rollout(self, attacker: int, target: int, cluster_mask: int, rng: random.Random) -> float:
+        state = self.root.clone()
+        if self.fight(state, attacker, target, rng, True):
+            current = target
+            remaining_mask = cluster_mask & ~(1 << target)
+            while remaining_mask:
+                next_target = self.static_map.get_attack_order(remaining_mask, current)[0]
+                if not self.static_map.adjacent[current] >> next_target & 1:
+                    break # Sweep would have to restart from another territory, stop here
+                if not self.fight(state, current, next_target, rng, False):
+                    break
+                current = next_target
+                remaining_mask &= ~(1 << next_target)
+        return self.evaluate(state)
+
+    # True if attacking target from attacker beats passing on average over the rollouts that fit in time_budget
+    def should_attack(self, attacker: int, target: int, cluster_mask: int, seed: int, time_budget: float) -> bool:
+        stop_value = self.evaluate(self.root)
+        rng = random.Random(seed)
+        start = perf_counter()
+        total = 0.0
+        rollouts = 0
+        while rollouts < ROLLOUT_MAX and (rollouts < ROLLOUT_MIN or perf_counter() - start < time_budget):
+            total += self.rollout(attacker, target, cluster_mask, rng)
+            rollouts += 1
+        logger.debug('rollouts: %d | attack: %.2f | pass: %.2f', rollouts, total / rollouts, stop_value)
+        return total / rollouts > stop_value
+
+# Sets a hand of card_count cards is sure to contain, by the pigeonhole principle any 5 cards hold a set
+def get_guaranteed_sets(card_count: int) -> int:
+    return 0 if card_count < 5 else (card_count - 5) // 3 + 1
+
+# Chooses which cards make up the sets we redeem. A set is worth the same troops whichever cards are in it (the value only
+# depends on how many sets were redeemed before), so past the number of sets the choice decides whether we get the matching
+# territory bonus and what we keep. Only each card's kind matters, so hands are searched as counts per kind and memoized.
+# Kinds are symbol index * 2 + 1 if we own the card's territory, wildcards are WILDCARD_KIND.
+class CardSetSolver():
+    WILDCARD_KIND = 2 * len(CARD_SYMBOLS)
+
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self.cache: dict[tuple, Optional[tuple[tuple[int, int, int], ...]]] = {}
+        self.set_kinds: list[tuple[int, int, int]] = []
+        for kinds in itertools.combinations_with_replacement(range(self.WILDCARD_KIND + 1), 3):
+            symbols = set(x // 2 for x in kinds if x != self.WILDCARD_KIND)
+            if self.WILDCARD_KIND in kinds or len(symbols) in (1, len(CARD_SYMBOLS)):
+                self.set_kinds.append(kinds)
+
+    def get_kind(self, game: Game, card: CardModel) -> int:
+        if card.symbol == WILDCARD_SYMBOL:
+            return self.WILDCARD_KIND
+        owned = card.territory_id != None and game.state.territories[card.territory_id].occupier == game.state.me.player_id
+        return CARD_SYMBOLS.index(card.symbol) * 2 + (1 if owned else 0)
+
+    # Higher is better: more sets, then the territory bonus, then wildcards kept, then different symbols kept
+    def get_score(self, counts: tuple[int, ...], sets: int, bonus: bool) -> tuple[int, bool, int, int]:
+        symbols_kept = sum(1 for x in range(len(CARD_SYMBOLS)) if counts[2 * x] + counts[2 * x + 1] > 0)
+        return (sets, bonus, counts[self.WILDCARD_KIND], symbols_kept)
+
+    # Best min_sets to max_sets sets out of a hand of counts per kind, as kind triples, or None if min_sets can't be made
+    def solve(self, counts: tuple[int, ...], min_sets: int, max_sets: int, bonus_available: bool) -> Optional[tuple[tuple[int, int, int], ...]]:
+        key = (counts, min_sets, max_sets, bonus_available)
+        if key in self.cache:
+            return self.cache[key]
+
+        # Sets are taken in set_kinds order so every combination is searched once
+        memo: dict[tuple, Optional[tuple]] = {}
+        def search(counts: tuple[int, ...], start: int, sets: int, bonus: bool) -> Optional[tuple]:
+            memo_key = (counts, start, sets, bonus)
+            if memo_key in memo:
+                return memo[memo_key]
+            best = None
+            if sets >= min_sets:
+                best = (self.get_score(counts, sets, bonus and bonus_available), ())
+            if sets < max_sets:
+                for x in range(start, len(self.set_kinds)):
+                    kinds = self.set_kinds[x]
+                    remaining = list(counts)
+                    for kind in kinds:
+                        remaining[kind] -= 1
+                    if min(remaining) < 0:
+                        continue
+                    result = search(tuple(remaining), x, sets + 1, bonus or any(kind % 2 == 1 for kind in kinds))
+                    if result != None and (best == None or result[0] > best[0]):
+                        best = (result[0], (kinds,) + result[1])
+            memo[memo_key] = best
+            return best
+
+        best = search(counts, 0, 0, False)
+        result = None if best == None else best[1]
+        if len(self.cache) >= self.max_size:
+            self.cache.clear()
+        self.cache[key] = result
+        return result
+
+    # Cards of each set to redeem, or None if cards can't make min_sets sets
+    def get_card_sets(self, game: Game, cards: list[CardModel], min_sets: int, max_sets: int) -> Optional[list[Tuple[CardModel, CardModel, CardModel]]]:
+        cards_by_kind: list[list[CardModel]] = [[] for _ in range(self.WILDCARD_KIND + 1)]
+        for card in cards:
+            cards_by_kind[self.get_kind(game, card)].append(card)
+        counts = tuple(len(x) for x in cards_by_kind)
+        # The bonus is only paid for the first matching card while none is waiting to be placed
+        bonus_available = len(game.state.me.must_place_territory_bonus) == 0
+        solution = self.solve(counts, min_sets, max_sets, bonus_available)
+        if solution == None:
+            return None
+        return [(cards_by_kind[a].pop(), cards_by_kind[b].pop(), cards_by_kind[c].pop()) for a, b, c in solution]
+
+card_set_solver = CardSetSolver(CARD_SET_CACHE_SIZE)
+
+# The tables above are built at import and bake in constants such as MIN_ATK_WIN_PROB and BATTLE_TABLE_CAP.
+# Whatever changes those constants after import (local_engine overrides) must call this so every part of the bot agrees.
+def rebuild_tables():
+    global path_cache, battle_table, sweep_estimator, sweep_simulator, card_set_solver
+    path_cache = PathCache(PATH_CACHE_SIZE)
+    battle_table = BattleTable(BATTLE_TABLE_CAP)
+    sweep_estimator = SweepEstimator(battle_table, SWEEP_CACHE_SIZE)
+    sweep_simulator = SweepSimulator(battle_table)
+    card_set_solver = CardSetSolver(CARD_SET_CACHE_SIZE)
+
+loaded_static_map: Optional[StaticMap] = None
+
+def get_static_map(game: Game) -> StaticMap:
+    global loaded_static_map
+    if loaded_static_map is None or loaded_static_map.map is not game.state.map:
+        loaded_static_map = StaticMap(game)
+    return loaded_static_map
+
+def to_mask(territories) -> int:
+    mask = 0
+    for territory in territories:
+        mask |= 1 << territory
+    return mask
+
+def from_mask(mask: int) -> list[int]:
+    result = []
+    while mask:
+        low = mask & -mask
+        result.append(low.bit_length() - 1)
+        mask ^= low
+    return result
+
+def get_owned_mask(game: Game, player_id: Optional[int]) -> int:
+    return get_snapshot(game).owned_mask.get(player_id, 0)
+
 class SelfState():
-    def __init__(self):
+    def __init__(self, static_map: StaticMap):
         self.cont_first_terr = [0, 9, 16, 28, 32, 38, 42]
         self.cont_terr_count = [9, 7, 12, 4, 6, 4]
         self.cont_count = 6
         self.cont_dict: dict[int, list[int]] = dict()
-        self.in_choke_points: dict[int, list[int]] = {0: [0, 2, 4], 1: [10, 14, 13, 15], 2: [21, 24, 26, 16, 22], 3: [29, 30], 4: [33, 34, 36], 5: [40]}
-        self.out_choke_points: dict[int, list[int]] = {0: [10, 21, 30], 1: [4, 16, 22, 26, 34, 36], 2: [0, 14, 13, 33, 34, 40], 3: [2, 36], 4: [13, 15, 22, 29], 5: [24]}
+        self.in_choke_masks: dict[int, int] = dict(static_map.in_choke)
+        self.out_choke_masks: dict[int, int] = dict(static_map.out_choke)
+        self.in_choke_points: dict[int, list[int]] = {cont: from_mask(x) for cont, x in self.in_choke_masks.items()}
+        self.out_choke_points: dict[int, list[int]] = {cont: from_mask(x) for cont, x in self.out_choke_masks.items()}
         self.prio_score: list[int] = [3, 5, 6, 2, 4, 1]
 
         self.base_prio: list[int] = [3, 5, 0, 4, 1, 2] # Continent priority (1st index highest prio)
@@ -108,9 +1186,13 @@ class SelfState():
         self.flag_done_forced_capture = False
         self.flag_cluster_reset = True
         self.flag_cluster_atk = False
+        self.pending_captures: list[tuple[int, int]] = [] # (attacking, conquered) territories not yet applied to clusters
+        self.deadline: Deadline = Deadline(QUERY_TIME_BUDGET)
 
         #self.cur_target_continent = -1 #TODO
         self.banned_init_territories: set[int] = set()
+        self.placement_plan: deque[tuple[int, bool]] = deque() # (territory, rotates initial_clusters) for each upcoming initial troop
+        self.placement_threat: tuple[int, ...] = () # Enemy troops in initial_clusters when placement_plan was made
 
         #init territories in each continent
         for i in range(6):
@@ -164,12 +1246,12 @@ class SelfState():
             cont_dict = game.state.map.get_continents()
             cont_keys = list(cont_dict.keys())
             top_prio = sorted(cont_keys, key=lambda x: get_continent_percent_owned(game, x), reverse=True)[0]
-            print('top_prio: ', top_prio, flush=True)
+            logger.debug('top_prio: ', top_prio)
             adj_cont = self.cont_adj[top_prio]
             adj_cont = sorted(adj_cont, key=lambda x: self.prio_score[x])
             self.cur_prio = [top_prio] + adj_cont
-            print('adj_cont: ', adj_cont, flush=True)
-            print('cur_prio: ', self.cur_prio, flush=True)
+            logger.debug('adj_cont: ', adj_cont)
+            logger.debug('cur_prio: ', self.cur_prio)
 
     def get_prio_and_owned_continents(self) -> list[int]:
         return self.cur_owned + self.cur_prio
@@ -178,6 +1260,34 @@ class SelfState():
         self.prio_clusters = deque()
         self.cur_cluster = TargetCluster(-1, [], [], -1, -1, -1, CL_TYPE_NONE)
         self.flag_cluster_reset = True
+        self.pending_captures = []
+
+    def apply_captures(self, game: Game):
+        """Update the tracked clusters for territories captured since the last attack query,
+        instead of regenerating every cluster."""
+        for attacking, conquered in self.pending_captures:
+            # Clusters book troops on their attacker in order, like generate_priority_clusters, and split pieces get new ids
+            booked_troops_count: dict[int, int] = defaultdict(lambda: 0)
+            next_id = max([self.cur_cluster.id] + [x.id for x in self.prio_clusters]) + 1
+            cur_clusters = update_target_cluster(game, self.cur_cluster, attacking, conquered, booked_troops_count, next_id)
+            next_id += max(len(cur_clusters) - 1, 0)
+            prio_clusters: deque[TargetCluster] = deque()
+            for target_cluster in self.prio_clusters:
+                pieces = update_target_cluster(game, target_cluster, attacking, conquered, booked_troops_count, next_id)
+                next_id += max(len(pieces) - 1, 0)
+                prio_clusters.extend(pieces)
+
+            if len(cur_clusters) > 0:
+                self.cur_cluster = cur_clusters[0]
+                prio_clusters.extendleft(reversed(cur_clusters[1:]))
+            else:
+                self.cur_cluster = TargetCluster(-1, [], [], -1, -1, -1, CL_TYPE_NONE)
+            self.prio_clusters = prio_clusters
+        self.pending_captures = []
+
+        # Nothing left to attack, fall back to generating new clusters
+        if len(self.cur_cluster.cluster) <= 0 and len(self.prio_clusters) <= 0:
+            self.reset_cluster()
 
 def main():
     
@@ -185,13 +1295,14 @@ def main():
     # track the state of the game.
     game = Game()
     bot_state = BotState()
-    self_state = SelfState()
+    self_state = SelfState(get_static_map(game))
    
     # Respond to the engine's queries with your moves.
     while True:
 
         # Get the engine's query (this will block until you receive a query).
         query = game.get_next_query()
+        begin_query(game, self_state)
 
         # Based on the type of query, respond with the correct move.
         def choose_move(query: QueryType) -> MoveType:
@@ -221,16 +1332,67 @@ def main():
                     return handle_fortify(game, self_state, bot_state, q)
         
         # Send the move to the engine.
-        game.send_move(choose_move(query))
+        try:
+            move = choose_move(query)
+        except BaseException:
+            logger.flush()
+            raise
+        game.send_move(move)
+
+        # Write out the turn's debug output once our move is already sent
+        if isinstance(query, QueryFortify):
+            end_turn(game, self_state)
                 
 
+# Called once per query before its handler runs
+def begin_query(game: Game, self_state: SelfState):
+    self_state.deadline.start()
+    get_snapshot(game)
+
+# Called after our fortify move, when our turn is over
+def end_turn(game: Game, self_state: SelfState):
+    logger.flush()
+
+opening_book: Optional[dict[str, int]] = None
+
+# Claim choices recorded from self-play by build_opening_book.py, empty if there is no book for this version of the bot
+def get_opening_book() -> dict[str, int]:
+    global opening_book
+    if opening_book is None:
+        opening_book = {}
+        try:
+            with open(OPENING_BOOK_PATH) as f:
+                book = json.load(f)
+        except (OSError, ValueError):
+            return opening_book
+        if book.get("version") == OPENING_BOOK_VERSION:
+            opening_book = book["claims"]
+        else:
+            logger.warning('Ignoring opening book version %s, expected %d', book.get("version"), OPENING_BOOK_VERSION)
+    return opening_book
+
+# Everything handle_claim_territory decides on: every territory's owner and our banned territories.
+# Owners are '.' if unclaimed, '0' for us, then '1', '2', ... for other players in order of first appearance. The claim
+# logic only counts and compares sets of players, so positions that differ only in who is who share a key.
+def get_opening_book_key(game: Game, self_state: SelfState) -> str:
+    snapshot = get_snapshot(game)
+    labels: dict[Optional[int], str] = {None: '.', snapshot.me: '0'}
+    owners = []
+    for owner in snapshot.owner:
+        if owner not in labels:
+            labels[owner] = str(len(labels) - 1)
+        owners.append(labels[owner])
+    return '%s:%x' % (''.join(owners), to_mask(self_state.banned_init_territories))
+
+@profiled('handle_claim_territory')
 def handle_claim_territory(game: Game, self_state: SelfState, bot_state: BotState, query: QueryClaimTerritory) -> MoveClaimTerritory:
     """At the start of the game, you can claim a single unclaimed territory every turn 
     until all the territories have been claimed by players."""
 
     #TODO make continent graph to change priorities reactively
-    unclaimed_territories = game.state.get_territories_owned_by(None)
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
+    snapshot = get_snapshot(game)
+    unclaimed_territories = snapshot.get_owned(None)
+    my_territories = snapshot.get_owned(snapshot.me)
     selected_territory = unclaimed_territories[0]
     #print("unclaimed[0]: " + str(unclaimed_territories[0]), flush=True)
     conts = get_my_continents(game)
@@ -244,14 +1406,19 @@ def handle_claim_territory(game: Game, self_state: SelfState, bot_state: BotStat
         self_state.banned_init_territories = set(game.state.map.get_continents()[conts[0]])
         flag_retry = True
 
+    # Positions seen in self-play are answered from the book, after banned_init_territories is up to date
+    book_territory = get_opening_book().get(get_opening_book_key(game, self_state), NOT_FOUND)
+    if book_territory != NOT_FOUND and snapshot.owner[book_territory] == None:
+        return game.move_claim_territory(query, book_territory)
+
     if len(my_territories) <= 0 or flag_retry:
         selected_territory = NOT_FOUND
+        unclaimed_mask = to_mask(unclaimed_territories)
         for i in range(6):
             is_empty = True
             cont = self_state.base_prio[i]
-            cont_terr = game.state.map.get_continents()[cont]
-            cont_available = list(set(unclaimed_territories) & set(cont_terr))
-            if len(cont_available) != len(cont_terr):
+            cont_mask = get_static_map(game).continent[cont]
+            if cont_mask & unclaimed_mask != cont_mask:
                 is_empty = False
 
             if is_empty:
@@ -272,24 +1439,69 @@ def handle_claim_territory(game: Game, self_state: SelfState, bot_state: BotStat
     #if not available, get adjacent land
     #adjacent_territories = game.state.get_all_adjacent_territories(my_territories)
     score = NOT_FOUND
-    unbanned_unclaimed_territories = list(set(unclaimed_territories)-self_state.banned_init_territories)
+    unbanned_unclaimed_territories = from_mask(to_mask(unclaimed_territories) & ~to_mask(self_state.banned_init_territories))
     if len(unbanned_unclaimed_territories) > 0:
-        selected_territory, score = get_highest_priority_starting_territory(game, self_state, list(set(unclaimed_territories)-self_state.banned_init_territories), set(conts))
+        selected_territory, score = get_highest_priority_starting_territory(game, self_state, unbanned_unclaimed_territories, set(conts))
     if score == NOT_FOUND:
         my_clusters = get_player_clusters(game, game.state.me.player_id)
         my_main_cluster = sorted(my_clusters, key=lambda x: get_troops_in_cluster(game, x), reverse=True)[0]
-        closest_node = find_closest_node_from_cluster_to_set(game, my_main_cluster, set(unclaimed_territories), set())
+        closest_node = find_closest_node_from_cluster_to_set(game, my_main_cluster, to_mask(unclaimed_territories), 0)
         selected_territory = closest_node
     return game.move_claim_territory(query, selected_territory)
 
+@profiled('handle_place_initial_troop')
 def handle_place_initial_troop(game: Game, self_state: SelfState, bot_state: BotState, query: QueryPlaceInitialTroop) -> MovePlaceInitialTroop:
     """After all the territories have been claimed, you can place a single troop on one
     of your territories each turn until each player runs out of troops."""
 
+    # Ownership can't change during placement, only enemy troops in our target clusters can change the plan
+    if len(self_state.placement_plan) <= 0 or get_placement_threat(game, self_state) != self_state.placement_threat:
+        plan_initial_placement(game, self_state)
+
+    territory, rotates_clusters = self_state.placement_plan.popleft()
+    if rotates_clusters:
+        self_state.initial_clusters.rotate(-1)
+    return game.move_place_initial_troop(query, territory)
+
+
+    """
+    cur_target_cluster = self_state.initial_clusters.popleft()
+    self_state.initial_clusters.append(cur_target_cluster)
+
+    
+
+    if get_continent_percent_owned(game, priority_continent) < 1.0:
+        owned_in_continent = get_owned_in_continent(game, priority_continent)
+        attacker_candidates = list(set(owned_in_continent)-set(priority_territories))
+        if len(attacker_candidates) > 0:
+            attacker = max(attacker_candidates, key=lambda x: game.state.territories[x].troops + len(set(my_territories) & set(game.state.map.get_adjacent_to(x))))
+            priority_territories.append(attacker)
+
+    #priority_territories = get_owned_in_continent(game, self_state, priority_continent)
+    #priority_territories = list(set(priority_territories) & set(border_territories)) #in-continent & borders
+    #priority_territories = list(set(priority_territories) | set(owned_out_choke)) # + important choke points
+
+    # We will place a troop in a priority territory with the least troops currently
+    # on it. This should give us close to an equal distribution.
+    priority_territory_models = [game.state.territories[x] for x in priority_territories]
+    min_troops_territory = min(priority_territory_models, key=lambda x: x.troops)
+
+    return game.move_place_initial_troop(query, min_troops_territory.territory_id)
+    """
+
+# Enemy troops in our initial target clusters, the only part of the board opponents can change that our placement depends on
+def get_placement_threat(game: Game, self_state: SelfState) -> tuple[int, ...]:
+    troops = get_snapshot(game).troops
+    return tuple(troops[x] for target in self_state.initial_clusters for x in target.cluster)
+
+# Works out where every remaining initial troop goes and stores it in self_state.placement_plan
+@profiled('plan_initial_placement')
+def plan_initial_placement(game: Game, self_state: SelfState):
     # Avoid troop < INIT_MIN_TROOPS territories early in main cluster
     # TODO: This does not consider that we can have more than 1 cluster in the same continent
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    border_territories = game.state.get_all_border_territories(my_territories)
+    snapshot = get_snapshot(game)
+    my_territories = snapshot.get_owned(snapshot.me)
+    border_territories = snapshot.get_border(snapshot.me)
     #my_clusters = get_player_clusters(game, game.state.me.player_id)
     #my_main_cluster = sorted(my_clusters, key=lambda x: get_troops_in_cluster(game, x), reverse=True)[0]
     #for territory in my_main_cluster:
@@ -305,26 +1517,33 @@ def handle_place_initial_troop(game: Game, self_state: SelfState, bot_state: Bot
 
     # Get all border(continent territory U owned_out_choke)
     #border_territories = game.state.get_all_border_territories(my_territories)
-    out_choke_territories = self_state.out_choke_points[priority_continent]
-    owned_out_choke = list(set(out_choke_territories) & set(my_territories)) #important
+    static_map = get_static_map(game)
+    my_mask = to_mask(my_territories)
+    owned_out_choke_mask = self_state.out_choke_masks[priority_continent] & my_mask #important
 
-    owned_in_choke = intersect_territories(self_state.in_choke_points[priority_continent], my_territories)
-    border_in_choke = intersect_territories(self_state.in_choke_points[priority_continent], border_territories)
+    owned_in_choke_mask = self_state.in_choke_masks[priority_continent] & my_mask
+    border_in_choke_mask = self_state.in_choke_masks[priority_continent] & to_mask(border_territories)
 
-    priority_territories = border_in_choke
-    non_border_in_choke = list(set(owned_in_choke) - set(border_in_choke))
-    for t in non_border_in_choke:
-        adjacent_out_choke = intersect_territories(game.state.map.get_adjacent_to(t), owned_out_choke)
-        if len(adjacent_out_choke) <= 1:
-            priority_territories = list(set(priority_territories).union(set(adjacent_out_choke)))
+    priority_mask = border_in_choke_mask
+    for t in from_mask(owned_in_choke_mask & ~border_in_choke_mask):
+        adjacent_out_choke_mask = static_map.adjacent[t] & owned_out_choke_mask
+        if adjacent_out_choke_mask.bit_count() <= 1:
+            priority_mask |= adjacent_out_choke_mask
+    priority_territories = from_mask(priority_mask)
 
     #continent_all_territory = game.state.map.get_continents()[priority_continent]
     #priority_territories = game.state.get_all_border_territories(continent_all_territory + owned_out_choke)
     #priority_territories = intersect_territories(priority_territories, my_territories)
 
+    # First bring every priority territory up to INIT_MIN_TROOPS, in order
+    plan: deque[tuple[int, bool]] = deque()
     for territory in priority_territories:
-        if game.state.territories[territory].troops < INIT_MIN_TROOPS:
-            return game.move_place_initial_troop(query, territory)
+        for _ in range(INIT_MIN_TROOPS - game.state.territories[territory].troops):
+            plan.append((territory, False))
+    if len(plan) > 0:
+        self_state.placement_plan = plan
+        self_state.placement_threat = get_placement_threat(game, self_state)
+        return
 
     # If we don't own the continent, attempt to assign an attacker
     if len(self_state.initial_clusters) <=0:
@@ -333,7 +1552,7 @@ def handle_place_initial_troop(game: Game, self_state: SelfState, bot_state: Bot
             clusters = get_clusters(game, unowned_in_continent)
             for cluster in clusters:
                 candidates = get_cluster_adjacent_friendly(game, cluster)
-                non_border_candidates = list(set(candidates) - set(priority_territories))
+                non_border_candidates = from_mask(to_mask(candidates) & ~priority_mask)
                 if len(non_border_candidates) > 0:
                     candidates = non_border_candidates
                 target_cluster = TargetCluster(0, cluster, cluster, candidates[0], 0, 0, CL_TYPE_CONTINENT)
@@ -346,47 +1565,39 @@ def handle_place_initial_troop(game: Game, self_state: SelfState, bot_state: Bot
             target_cluster = TargetCluster(0, target_territories, target_territories, attacker, 0, 0, CL_TYPE_CONTINENT)
             self_state.initial_clusters.append(target_cluster)
     
-    tmp = self_state.initial_clusters.popleft()
-    self_state.initial_clusters.append(tmp)
-
-    highest_diff_score = 0
-    highest_diff_cluster_attacker = NOT_FOUND
-    for target in self_state.initial_clusters:
-        diff_score = get_cluster_difficulty_score(game, target.cluster)
-        if diff_score > game.state.territories[target.attacker].troops:
-            return game.move_place_initial_troop(query, target.attacker)
-        if diff_score > highest_diff_score:
-            highest_diff_score = diff_score
-            highest_diff_cluster_attacker = target.attacker
-    
-    return game.move_place_initial_troop(query, highest_diff_cluster_attacker)
-
-
-    """
-    cur_target_cluster = self_state.initial_clusters.popleft()
-    self_state.initial_clusters.append(cur_target_cluster)
-
-    
-
-    if get_continent_percent_owned(game, priority_continent) < 1.0:
-        owned_in_continent = get_owned_in_continent(game, priority_continent)
-        attacker_candidates = list(set(owned_in_continent)-set(priority_territories))
-        if len(attacker_candidates) > 0:
-            attacker = max(attacker_candidates, key=lambda x: game.state.territories[x].troops + len(set(my_territories) & set(game.state.map.get_adjacent_to(x))))
-            priority_territories.append(attacker)
-
-    #priority_territories = get_owned_in_continent(game, self_state, priority_continent)
-    #priority_territories = list(set(priority_territories) & set(border_territories)) #in-continent & borders
-    #priority_territories = list(set(priority_territories) | set(owned_out_choke)) # + important choke points
-
-    # We will place a troop in a priority territory with the least troops currently
-    # on it. This should give us close to an equal distribution.
-    priority_territory_models = [game.state.territories[x] for x in priority_territories]
-    min_troops_territory = min(priority_territory_models, key=lambda x: x.troops)
-
-    return game.move_place_initial_troop(query, min_troops_territory.territory_id)
-    """
-
+    # Then play out the cluster rotation for every troop we have left, feeding each placement into the next choice.
+    # Our placements only move the best attacker of a cluster, so difficulty is scored once per (cluster, attacker)
+    targets = list(self_state.initial_clusters)
+    candidates = [get_cluster_adjacent_friendly(game, target.cluster) for target in targets]
+    difficulty: dict[tuple[int, int], int] = {}
+    troops = list(snapshot.troops)
+    rotation = deque(range(len(targets)))
+    for _ in range(max(game.state.me.troops_remaining, 1)):
+        rotation.rotate(-1)
+        highest_diff_score = 0
+        highest_diff_cluster_attacker = NOT_FOUND
+        for index in rotation:
+            target = targets[index]
+            attacker = max(candidates[index], key=lambda x: troops[x]) if len(candidates[index]) > 0 else NOT_FOUND
+            if (index, attacker) not in difficulty:
+                difficulty[(index, attacker)] = get_cluster_difficulty_score(game, target.cluster, attacker)
+            diff_score = difficulty[(index, attacker)]
+            if diff_score > troops[target.attacker]:
+                highest_diff_cluster_attacker = target.attacker
+                break
+            if diff_score > highest_diff_score:
+                highest_diff_score = diff_score
+                highest_diff_cluster_attacker = target.attacker
+        if highest_diff_cluster_attacker == NOT_FOUND:
+            # No target needs troops (or there are none), reinforce our strongest border instead
+            highest_diff_cluster_attacker = max(border_territories if len(border_territories) > 0 else my_territories, key=lambda x: troops[x])
+        troops[highest_diff_cluster_attacker] += 1
+        plan.append((highest_diff_cluster_attacker, True))
+
+    self_state.placement_plan = plan
+    self_state.placement_threat = get_placement_threat(game, self_state)
+
+@profiled('handle_redeem_cards')
 def handle_redeem_cards(game: Game, self_state: SelfState, bot_state: BotState, query: QueryRedeemCards) -> MoveRedeemCards:
     """After the claiming and placing initial troops phases are over, you can redeem any
     cards you have at the start of each turn, or after killing another player."""
@@ -396,29 +1607,24 @@ def handle_redeem_cards(game: Game, self_state: SelfState, bot_state: BotState,
     # This is just an arbitrary choice to try and save our cards for the late game.
 
     # We always have to redeem enough cards to reduce our card count below five.
-    card_sets: list[Tuple[CardModel, CardModel, CardModel]] = []
-    cards_remaining = game.state.me.cards.copy()
-
-    while len(cards_remaining) >= 5:
-        card_set = game.state.get_card_set(cards_remaining)
-        # According to the pigeonhole principle, we should always be able to make a set
-        # of cards if we have at least 5 cards.
-        assert card_set != None
-        card_sets.append(card_set)
-        cards_remaining = [card for card in cards_remaining if card not in card_set]
+    cards = game.state.me.cards
+    min_sets = get_guaranteed_sets(len(cards))
+    max_sets = min_sets
 
     # Remember we can't redeem any more than the required number of card sets if 
     # we have just eliminated a player.
     if game.state.card_sets_redeemed > CARDS_REDEEMED_LATE_GAME and query.cause == "turn_started":
-        card_set = game.state.get_card_set(cards_remaining)
-        while card_set != None:
-            card_sets.append(card_set)
-            cards_remaining = [card for card in cards_remaining if card not in card_set]
-            card_set = game.state.get_card_set(cards_remaining)
+        max_sets = len(cards) // 3
+
+    card_sets = card_set_solver.get_card_sets(game, cards, min_sets, max_sets)
+    # According to the pigeonhole principle, we should always be able to make a set
+    # of cards if we have at least 5 cards.
+    assert card_sets != None
 
     return game.move_redeem_cards(query, [(x[0].card_id, x[1].card_id, x[2].card_id) for x in card_sets])
 
 
+@profiled('handle_distribute_troops')
 def handle_distribute_troops(game: Game, self_state: SelfState, bot_state: BotState, query: QueryDistributeTroops) -> MoveDistributeTroops:
     """After you redeem cards (you may have chosen to not redeem any), you need to distribute
     all the troops you have available across your territories. This can happen at the start of
@@ -432,12 +1638,13 @@ def handle_distribute_troops(game: Game, self_state: SelfState, bot_state: BotSt
     # We will distribute troops across our border territories.
     total_troops = game.state.me.troops_remaining
     distributions = defaultdict(lambda: 0)
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    border_territories = game.state.get_all_border_territories(my_territories)
+    snapshot = get_snapshot(game)
+    my_territories = snapshot.get_owned(snapshot.me)
+    border_territories = snapshot.get_border(snapshot.me)
 
     my_clusters = get_player_clusters(game, game.state.me.player_id)
     my_main_cluster = sorted(my_clusters, key=lambda x: get_troops_in_cluster(game, x), reverse=True)[0]
-    main_border_territories = game.state.get_all_border_territories(my_main_cluster)
+    main_border_territories = from_mask(get_static_map(game).get_border_mask(to_mask(my_main_cluster)))
 
     # We need to remember we have to place our matching territory bonus
     # if we have one.
@@ -463,27 +1670,23 @@ def handle_distribute_troops(game: Game, self_state: SelfState, bot_state: BotSt
     disrupt_dstrb: list[TargetCluster] = []
     forced_dstrb: list[TargetCluster] = []
 
-    player_total_difficulty = 0
     player_assigned_troops = 0
-    continent_total_difficulty = 0
     continent_assigned_troops = 0
     target_continents = set()
     continent_required_troops: dict[int, int] = defaultdict(lambda: 0)
     continent_cluster_count: dict[int, int] = defaultdict(lambda: 0)
 
-    print('dstrb', flush=True)
+    logger.debug('dstrb')
     for target_cluster in generate_priority_clusters(game, self_state, total_troops):
 
         if target_cluster.type == CL_TYPE_PLAYER:
-            print('pl_cluster: ', target_cluster.cluster, flush=True)
+            logger.debug('pl_cluster: ', target_cluster.cluster)
             player_dstrb.append(target_cluster)
-            player_total_difficulty += target_cluster.difficulty_score
             player_assigned_troops += target_cluster.recommended_troops
             
         elif target_cluster.type == CL_TYPE_CONTINENT:
-            print('cl_cluster: ', target_cluster.cluster, ' | continent: ', target_cluster.continent, flush=True)
+            logger.debug('cl_cluster: ', target_cluster.cluster, ' | continent: ', target_cluster.continent)
             target_continents.add(target_cluster.continent)
-            continent_total_difficulty += target_cluster.difficulty_score
             continent_required_troops[target_cluster.continent] += target_cluster.recommended_troops
             continent_cluster_count[target_cluster.continent] += 1
             continent_dstrb.append(target_cluster)
@@ -507,17 +1710,16 @@ def handle_distribute_troops(game: Game, self_state: SelfState, bot_state: BotSt
                     total_troops -= 1
 
     continent_assigned_troops = total_troops-player_assigned_troops
-    print('ct_asg_trps: ', continent_assigned_troops, flush=True)
+    logger.debug('ct_asg_trps: ', continent_assigned_troops)
 
     if len(player_dstrb) > 0 and continent_assigned_troops > 0:
+        base_troops = {dstrb.attacker: game.state.territories[dstrb.attacker].troops + distributions[dstrb.attacker] for dstrb in player_dstrb}
         for dstrb in player_dstrb:
-            bonus_troops = (continent_assigned_troops*dstrb.difficulty_score)//player_total_difficulty
+            base_troops[dstrb.attacker] += dstrb.recommended_troops
+        split = choose_troop_split(game, self_state, player_dstrb, continent_assigned_troops, base_troops, 0)
+        for dstrb, bonus_troops in zip(player_dstrb, split):
             dstrb.recommended_troops += bonus_troops
-            continent_assigned_troops -= bonus_troops
-            if continent_assigned_troops <= 0:
-                break
-        player_dstrb[0].recommended_troops += continent_assigned_troops
-        continent_assigned_troops -= continent_assigned_troops
+        continent_assigned_troops = 0
     
     for dstrb in player_dstrb:
         self_state.prio_clusters.append(dstrb)
@@ -547,18 +1749,11 @@ def handle_distribute_troops(game: Game, self_state: SelfState, bot_state: BotSt
     
     # Distribute remaining troops among target continents
     if len(continent_dstrb) > 0:
-        remaining_troops = total_troops
-        highest_diff_score_attacker = NOT_FOUND
-        highest_diff_score = 0
-        for dstrb in continent_dstrb:
-            bonus_troops = (remaining_troops*dstrb.difficulty_score)//continent_total_difficulty
+        base_troops = {dstrb.attacker: game.state.territories[dstrb.attacker].troops + distributions[dstrb.attacker] for dstrb in continent_dstrb}
+        hardest = max(range(len(continent_dstrb)), key=lambda x: continent_dstrb[x].difficulty_score)
+        split = choose_troop_split(game, self_state, continent_dstrb, total_troops, base_troops, hardest)
+        for dstrb, bonus_troops in zip(continent_dstrb, split):
             distributions[dstrb.attacker] += bonus_troops
-            total_troops -= bonus_troops
-            if dstrb.difficulty_score > highest_diff_score:
-                highest_diff_score = dstrb.difficulty_score
-                highest_diff_score_attacker = dstrb.attacker
-        
-        distributions[highest_diff_score_attacker] += total_troops
         total_troops  = 0
 
     """
@@ -567,8 +1762,8 @@ def handle_distribute_troops(game: Game, self_state: SelfState, bot_state: BotSt
         priority_target_cont = sorted(list(target_continents), key=lambda x: continent_required_troops[x])[0]
         remainder = continent_assigned_troops%continent_cluster_count[priority_target_cont]
         #continent_assigned_troops -= remainder
-        print('prio_t_cont: ', priority_target_cont, flush=True)
-        print('rmndr: ', remainder, flush=True)
+        logger.debug('prio_t_cont: ', priority_target_cont)
+        logger.debug('rmndr: ', remainder)
 
         for dstrb in continent_dstrb:
             if continent_assigned_troops <= 0:
@@ -599,51 +1794,66 @@ def handle_distribute_troops(game: Game, self_state: SelfState, bot_state: BotSt
     return game.move_distribute_troops(query, distributions)
 
 
+@profiled('handle_attack')
 def handle_attack(game: Game, self_state: SelfState, bot_state: BotState, query: QueryAttack) -> Union[MoveAttack, MoveAttackPass]:
     """After the troop phase of your turn, you may attack any number of times until you decide to
     stop attacking (by passing). After a successful attack, you may move troops into the conquered
     territory. If you eliminated a player you will get a move to redeem cards and then distribute troops."""
-    start_time = time()
+    deadline = self_state.deadline
 
     self_state.change_cur_prio(game)
     #cur_prio = self_state.cur_prio[0]
     #self_state.update_weakest_players(game)
 
+    if not self_state.flag_cluster_reset and len(self_state.pending_captures) > 0:
+        self_state.apply_captures(game)
+
     if self_state.flag_cluster_reset:
         for target_cluster in generate_priority_clusters(game, self_state, 0):
             self_state.prio_clusters.append(target_cluster)
         self_state.flag_cluster_reset = False
 
-    print("Done gen clusters --- %s seconds ---" % (time() - start_time), flush=True)
 
-    print('\nround = %d', len(game.state.recording), flush=True)
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
+    logger.debug('\nround = %d', len(game.state.recording))
+    snapshot = get_snapshot(game)
+    my_territories = snapshot.get_owned(snapshot.me)
     #target_territories = game.state.get_all_adjacent_territories(my_territories)
-    border_territories = game.state.get_all_border_territories(my_territories)
+    border_territories = snapshot.get_border(snapshot.me)
 
-    def attempt_attack(a, t) -> Optional[MoveAttack]:
+    # The board doesn't change within a query, so one search and one rollout budget serve every target we consider
+    rollout_search: Optional[RolloutSearch] = None
+    rollout_end = perf_counter() + min(ROLLOUT_TIME_BUDGET, deadline.remaining() - deadline.budget * DEADLINE_MARGIN)
+
+    # targets_left: candidates still to be tried including t, they share what is left of the rollout budget
+    def attempt_attack(a, t, targets_left: int) -> Optional[MoveAttack]:
+        nonlocal rollout_search
         a_troops = game.state.territories[a].troops
         t_troops = game.state.territories[t].troops
-        if t_troops <= 1:
-            if a_troops >= MIN_ATK_SINGLE:
-                self_state.flag_atk = True
-                return game.move_attack(query, a, t, min(3, game.state.territories[a].troops - 1))
-        else:
-            if a_troops >= MIN_ATK and a_troops >= (t_troops + MIN_ATK_TROOP_DIFF):
-                self_state.flag_atk = True
-                return game.move_attack(query, a, t, min(3, game.state.territories[a].troops - 1))
+        if a_troops <= 1:
+            return None
+        win_prob = battle_table.get_win_probability(a_troops, t_troops)
+        worth_attacking = win_prob >= MIN_ATK_WIN_PROB
+        # Only borderline battles are worth rolling out, clear wins and losses keep the threshold answer
+        rollout_budget = rollout_end - perf_counter()
+        if ROLLOUT_SEARCH_ENABLED and ROLLOUT_MIN_WIN_PROB <= win_prob < ROLLOUT_MAX_WIN_PROB and rollout_budget > 0 and not deadline.should_degrade('attack rollouts'):
+            if rollout_search == None:
+                rollout_search = RolloutSearch(game, self_state.flag_done_forced_capture)
+            worth_attacking = rollout_search.should_attack(a, t, to_mask(self_state.cur_cluster.cluster), len(game.state.recording), rollout_budget / targets_left)
+        if worth_attacking:
+            self_state.flag_atk = True
+            return game.move_attack(query, a, t, min(3, game.state.territories[a].troops - 1))
             
         return None
 
-    print("CURRENT_CLUSTERS", flush=True)
-    print("cluster: ", self_state.cur_cluster.cluster, "ori_cluster: ", self_state.cur_cluster.ori_cluster, 
+    logger.debug("CURRENT_CLUSTERS")
+    logger.debug("cluster: ", self_state.cur_cluster.cluster, "ori_cluster: ", self_state.cur_cluster.ori_cluster, 
           "\nscore: ", self_state.cur_cluster.difficulty_score, " | rec_troops: ", self_state.cur_cluster.recommended_troops, 
-          "\n continent: ", self_state.cur_cluster.continent, " | type: ", self_state.cur_cluster.type, flush=True)
-    print("PRIO_CLUSTERS", flush=True)
-    for p_cluster in self_state.prio_clusters:
-        print("cluster: ", p_cluster.cluster, "ori_cluster: ", p_cluster.ori_cluster,
+          "\n continent: ", self_state.cur_cluster.continent, " | type: ", self_state.cur_cluster.type)
+    logger.debug("PRIO_CLUSTERS")
+    for p_cluster in self_state.prio_clusters if logger.is_enabled(LOG_DEBUG) else []:
+        logger.debug("cluster: ", p_cluster.cluster, "ori_cluster: ", p_cluster.ori_cluster,
                "\nscore: ", p_cluster.difficulty_score, " | rec_troops: ", p_cluster.recommended_troops, 
-               "\n continent: ", p_cluster.continent, " | type: ", p_cluster.type, flush=True)
+               "\n continent: ", p_cluster.continent, " | type: ", p_cluster.type)
     
     while len(self_state.prio_clusters) > 0 or len(self_state.cur_cluster.cluster) > 0:
         #print('prio_clusters: ', self_state.prio_clusters, flush=True)
@@ -659,33 +1869,30 @@ def handle_attack(game: Game, self_state: SelfState, bot_state: BotState, query:
             continue
 
         extra = []
-        if (self_state.cur_cluster.type == CL_TYPE_CONTINENT or self_state.cur_cluster.type == CL_TYPE_FORCED) and len(set(self_state.cur_cluster.cluster) - set(self_state.cur_cluster.ori_cluster)) <= 0:
+        if (self_state.cur_cluster.type == CL_TYPE_CONTINENT or self_state.cur_cluster.type == CL_TYPE_FORCED) and to_mask(self_state.cur_cluster.cluster) & ~to_mask(self_state.cur_cluster.ori_cluster) == 0:
             continent = self_state.cur_cluster.continent # continent we are attacking
-            out_choke = self_state.out_choke_points[continent]
-            adjacent_to_cluster = game.state.get_all_adjacent_territories(self_state.cur_cluster.cluster)
-            candidate_extra = list(set(out_choke) - set(my_territories))
-            candidate_extra = intersect_territories(candidate_extra, adjacent_to_cluster)
+            static_map = get_static_map(game)
+            adjacent_to_cluster_mask = static_map.get_adjacent_mask(to_mask(self_state.cur_cluster.cluster))
+            candidate_extra_mask = self_state.out_choke_masks[continent] & ~to_mask(my_territories) & adjacent_to_cluster_mask
 
             for cont in self_state.cur_prio:
-                for territory in candidate_extra:
-                    if territory in game.state.map.get_continents()[cont]:
-                        extra.append(territory)
-                        break
-                if len(extra) >=1:
+                cont_extra_mask = candidate_extra_mask & static_map.continent[cont]
+                if cont_extra_mask:
+                    extra.append(from_mask(cont_extra_mask)[0])
                     break
 
-        print('pre-sorted target candidates: ', candidate_targets, flush=True)
+        logger.debug('pre-sorted target candidates: ', candidate_targets)
         #candidate_targets = sorted(candidate_targets, key=lambda x: is_target_cut_node(game, self_state.cur_cluster.cluster + extra, x))
-        candidate_targets = sort_attack_priority(game, self_state.cur_cluster.cluster + extra, candidate_targets)
-        for target in candidate_targets:
-            move = attempt_attack(cluster_attacker, target)
+        use_cut_nodes = not deadline.should_degrade('cut node sorting')
+        candidate_targets = sort_attack_priority(game, self_state.cur_cluster.cluster + extra, candidate_targets, use_cut_nodes)
+        for x, target in enumerate(candidate_targets):
+            move = attempt_attack(cluster_attacker, target, len(candidate_targets) - x)
             if move != None:
                 self_state.flag_cluster_atk = True
-                print('target candidates: ', candidate_targets, flush=True)
-                print('target: ', target, flush=True)
-                print('target cluster: ', self_state.cur_cluster.cluster, flush=True)
-                print('my territories: ', my_territories, flush=True)
-                print("D --- %s seconds ---" % (time() - start_time), flush=True)
+                logger.debug('target candidates: ', candidate_targets)
+                logger.debug('target: ', target)
+                logger.debug('target cluster: ', self_state.cur_cluster.cluster)
+                logger.debug('my territories: ', my_territories)
                 return move
                 
         #TODO: resets cur_cluster, can be improved
@@ -716,6 +1923,7 @@ def handle_attack(game: Game, self_state: SelfState, bot_state: BotState, query:
     return game.move_attack_pass(query)
 
 
+@profiled('handle_troops_after_attack')
 def handle_troops_after_attack(game: Game, self_state: SelfState, bot_state: BotState, query: QueryTroopsAfterAttack) -> MoveTroopsAfterAttack:
     """After conquering a territory in an attack, you must move troops to the new territory."""
     #TODO
@@ -743,13 +1951,14 @@ def handle_troops_after_attack(game: Game, self_state: SelfState, bot_state: Bot
             if cluster.attacker == move_attack.attacking_territory and cluster.type <= attack_type:
                 if move_attack.defending_territory not in cluster.cluster:
                     booked_troops += cluster.difficulty_score
-                    print('Booked by: ', cluster.cluster, ' | num: ', cluster.difficulty_score, flush=True)
-        print('Booked troops total: ', booked_troops, flush=True)
-    self_state.reset_cluster()
+                    logger.debug('Booked by: ', cluster.cluster, ' | num: ', cluster.difficulty_score)
+        logger.debug('Booked troops total: ', booked_troops)
+    if not self_state.flag_cluster_reset:
+        self_state.pending_captures.append((move_attack.attacking_territory, move_attack.defending_territory))
     self_state.flag_cluster_atk = False
 
     if attack_type == CL_TYPE_FORCED:
-        print('Is forced attack', flush=True)
+        logger.debug('Is forced attack')
         return game.move_troops_after_attack(query, move_attack.attacking_troops)
     
     if attack_type == CL_TYPE_DISRUPT:
@@ -760,18 +1969,17 @@ def handle_troops_after_attack(game: Game, self_state: SelfState, bot_state: Bot
     #    print('Is forced attack', flush=True)
     #    return game.move_troops_after_attack(query, move_attack.attacking_troops)
 
-    adjacent_territories = game.state.map.get_adjacent_to(move_attack.defending_territory)
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    border_territories = game.state.get_all_border_territories(my_territories)
+    snapshot = get_snapshot(game)
+    my_territories = snapshot.get_owned(snapshot.me)
+    border_territories = snapshot.get_border(snapshot.me)
     continent = get_territory_continent(move_attack.attacking_territory)
-    in_choke = self_state.in_choke_points[continent]
 
     #for target_cluster in generate_priority_clusters(game, 0):
     #    self_state.prio_clusters.append(target_cluster)
 
     #if conquered territory is not border, move minimum amount
-    if len(set(adjacent_territories) - set(my_territories)) <= 0:
-        print('Conquered territory is border', flush=True)
+    if get_static_map(game).adjacent[move_attack.defending_territory] & ~to_mask(my_territories) == 0:
+        logger.debug('Conquered territory is border')
         return game.move_troops_after_attack(query, move_attack.attacking_troops)
 
     if game.state.card_sets_redeemed > CARDS_REDEEMED_LATE_GAME and attack_type != CL_TYPE_PLAYER:
@@ -780,15 +1988,16 @@ def handle_troops_after_attack(game: Game, self_state: SelfState, bot_state: Bot
 
     #TODO update to consider choke that borders 2 continents
     # Don't do this if late game
-    if move_attack.attacking_territory in (set(border_territories) & set(in_choke)) and len(game.state.recording) < MID_GAME:#MID_GAME
+    if (to_mask(border_territories) & self_state.in_choke_masks[continent]) >> move_attack.attacking_territory & 1 and len(game.state.recording) < MID_GAME:#MID_GAME
         moving_troops = max(game.state.territories[move_attack.attacking_territory].troops - max(MIN_CHOKE, booked_troops), move_attack.attacking_troops)
-        print('Attacking territory is choke', flush=True)
+        logger.debug('Attacking territory is choke')
         return game.move_troops_after_attack(query, moving_troops)
 
     # We will always move the maximum number of troops we can.
     return game.move_troops_after_attack(query, max(game.state.territories[move_attack.attacking_territory].troops - max(1, booked_troops), move_attack.attacking_troops))
 
 
+@profiled('handle_defend')
 def handle_defend(game: Game, self_state: SelfState, bot_state: BotState, query: QueryDefend) -> MoveDefend:
     """If you are being attacked by another player, you must choose how many troops to defend with."""
 
@@ -804,6 +2013,7 @@ def handle_defend(game: Game, self_state: SelfState, bot_state: BotState, query:
     return game.move_defend(query, defending_troops)
 
 
+@profiled('handle_fortify')
 def handle_fortify(game: Game, self_state: SelfState, bot_state: BotState, query: QueryFortify) -> Union[MoveFortify, MoveFortifyPass]:
     """At the end of your turn, after you have finished attacking, you may move a number of troops between
     any two of your territories (they must be adjacent)."""
@@ -812,17 +2022,19 @@ def handle_fortify(game: Game, self_state: SelfState, bot_state: BotState, query
     self_state.flag_atk = False
     self_state.flag_done_forced_capture = False
 
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    border_territories = game.state.get_all_border_territories(my_territories)
+    snapshot = get_snapshot(game)
+    my_territories = snapshot.get_owned(snapshot.me)
+    border_territories = snapshot.get_border(snapshot.me)
 
-    non_border_territories = list(set(my_territories)-set(border_territories))
+    border_mask = to_mask(border_territories)
+    non_border_territories = from_mask(to_mask(my_territories) & ~border_mask)
     if len(non_border_territories) <= 0:
-        print("No border territory found")
+        logger.debug("No border territory found")
         return game.move_fortify_pass(query)
 
     non_border_territories = sorted(non_border_territories, key=lambda x: game.state.territories[x].troops, reverse=True)
     fortify_source = non_border_territories[0]
-    shortest_path = find_shortest_path_from_vertex_to_set(game, fortify_source, set(border_territories))
+    shortest_path = find_shortest_path_from_vertex_to_set(game, fortify_source, border_mask)
     #print("shortest path: ", shortest_path, flush=True)
     #print("fortify source: ", fortify_source, flush=True)
     if len(shortest_path) > 0 and game.state.territories[fortify_source].troops > 1:
@@ -830,134 +2042,117 @@ def handle_fortify(game: Game, self_state: SelfState, bot_state: BotState, query
 
     return game.move_fortify_pass(query)
 
-def find_shortest_path_from_vertex_to_set(game: Game, source: int, target_set: set[int]) -> list[int]:
+def find_shortest_path_from_vertex_to_set(game: Game, source: int, target_mask: int) -> list[int]:
     """Used in move_fortify()."""
 
-    # We perform a BFS search from our source vertex, stopping at the first member of the target_set we find.
-    queue = deque()
-    queue.appendleft(source)
-
-    current = queue.pop()
-    parent = {}
-    seen = {current: True}
-
-    #print(len(queue), flush=True)
-    while True:
-        if current in target_set:
-            break
-
-        for neighbour in game.state.map.get_adjacent_to(current):
-            if neighbour not in seen:
-                seen[neighbour] = True
-                parent[neighbour] = current
-                queue.appendleft(neighbour)
+    # Pick the closest member of target_mask from the distance table, then follow the next-hop table to it.
+    static_map = get_static_map(game)
+    if target_mask >> source & 1:
+        return []
 
-        if len(queue) <= 0:
-            break
-        current = queue.pop()
+    distance = static_map.distance[source]
+    targets = from_mask(target_mask)
+    if len(targets) <= 0:
+        return []
+    target = min(targets, key=lambda x: distance[x])
+    if distance[target] == INF_INT:
+        return []
 
     path = []
-    while current in parent:
+    current = source
+    while current != target:
+        current = static_map.next_hop[current][target]
         path.append(current)
-        current = parent[current]
 
-    return path[::-1]
+    return path
 
-def find_closest_node_from_cluster_to_set(game: Game, source_cluster: list[int], target_set: set[int], banned: set[int]) -> int:
+def find_closest_node_from_cluster_to_set(game: Game, source_cluster: list[int], target_mask: int, banned_mask: int) -> int:
     """Used in initial territory claim."""
 
-    # We perform a BFS search from our source vertex, stopping at the first member of the target_set we find.
-    queue = deque()
-    #queue.appendleft(source)
-
-    #current = queue.pop()
-    #parent = {}
-    seen: dict[int, bool] = {}
-
-    for x in source_cluster:
-        #queue.append(x)
-        seen[x] = True
-
-    for x in game.state.get_all_adjacent_territories(source_cluster):
-        if x not in banned:
-            seen[x] = True
-            queue.append(x)
-    current = queue.pop()
-
-    #print(len(queue), flush=True)
-    while True:
-        if current in target_set:
-            break
-
-        for neighbour in game.state.map.get_adjacent_to(current):
-            if neighbour not in seen and neighbour not in banned:
-                seen[neighbour] = True
-                #parent[neighbour] = current
-                queue.appendleft(neighbour)
+    # We perform a BFS search from the cluster, stopping at the first member of the target_mask we find.
+    # The visiting order decides ties between equally close targets, so the first ring is taken from the highest id down.
+    static_map = get_static_map(game)
+    source_mask = to_mask(source_cluster)
+    adjacent_mask = static_map.get_adjacent_mask(source_mask) & ~banned_mask
+    seen_mask = source_mask | adjacent_mask
+    queue = deque(from_mask(adjacent_mask))
 
-        if len(queue) <= 0:
-            break
+    while len(queue) > 0:
         current = queue.pop()
-
-    return current
+        if target_mask >> current & 1:
+            return current
+        for neighbour in from_mask(static_map.adjacent[current] & ~seen_mask & ~banned_mask):
+            seen_mask |= 1 << neighbour
+            queue.appendleft(neighbour)
+    return NOT_FOUND
 
 def get_territory_weight_wrt_cluster(game: Game, territory: int, cluster: list[int]) -> int:
     if territory in cluster:
         return 0
     
     #TODO: consider troop count in territory
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    if territory in my_territories:
-        return 0
-    
-    troop_count = game.state.territories[territory].troops
-
-    if troop_count == 1:
-        return troop_count
-    
-    return troop_count + 1
+    # 0 if ours, 1 for a single troop, troops + 1 otherwise
+    return get_snapshot(game).path_weights[territory]
 
 # targets = our border territories
-# returns path to cluster ([0] is border territory closest to cluster)
-def get_best_path_to_cluster(game: Game, cluster: list[int], targets: list[int], banned: set[int]) -> tuple[list[int], int]:
-    # Initialize minimum weights and priority queue    
-    start = cluster[0]
-    min_weights = {node: INF_INT for node in range(0,42)}
-    min_weights[start] = get_territory_weight_wrt_cluster(game, start, cluster)
-    priority_queue = [(min_weights[start], start)]  # (accumulated weight, node)
-    parent = {start: NOT_FOUND}
-
-    #territories_adjacent_to_cluster = game.state.get_all_adjacent_territories(cluster)
-    
+# returns best path from every reachable target to the cluster ([0] is the target, [-1] is a cluster territory)
+def get_best_paths_to_cluster(game: Game, cluster: list[int], targets: list[int], banned_mask: int) -> dict[int, tuple[list[int], int]]:
+    snapshot = get_snapshot(game)
+    key = (to_mask(cluster), to_mask(targets), banned_mask, snapshot.owned_mask[snapshot.me], snapshot.enemy_troops)
+    result = path_cache.get(key)
+    if result == None:
+        result = search_best_paths_to_cluster(game, cluster, targets, banned_mask)
+        path_cache.put(key, result)
+    return {target: (list(path), weight) for target, (path, weight) in result.items()}
+
+@profiled('search_best_paths_to_cluster')
+def search_best_paths_to_cluster(game: Game, cluster: list[int], targets: list[int], banned_mask: int) -> dict[int, tuple[list[int], int]]:
+    # Seed every cluster territory at weight 0 and run a single Dijkstra outwards,
+    # targets are terminal so a path never crosses one of our own border territories
+    # Weights are materialized once per search so the loop below only does list lookups
+    adjacent_list = get_static_map(game).adjacent_list
+    weights = list(get_snapshot(game).path_weights)
+    targets_mask = to_mask(targets)
+    min_weights = [INF_INT] * len(adjacent_list)
+    parent = [NOT_FOUND] * len(adjacent_list)
+    priority_queue = []  # (accumulated weight, node)
+    for node in cluster:
+        weights[node] = 0
+        min_weights[node] = 0
+        priority_queue.append((0, node))
+    heapq.heapify(priority_queue)
+
+    paths: dict[int, tuple[list[int], int]] = {}
     while priority_queue:
         current_weight, current_node = heapq.heappop(priority_queue)
-        
-        # If we reached one of the target nodes, return the accumulated weight
-        if current_node in targets:
-            path = []
-            while current_node != NOT_FOUND:
-                path.append(current_node)
-                current_node = parent[current_node]
-            return (path, current_weight)
-        
+
         # If the popped node has a greater weight than the known minimum weight, skip it
         if current_weight > min_weights[current_node]:
             continue
-        
+
+        # Reached one of the targets, record the path back to the cluster
+        if targets_mask >> current_node & 1:
+            path = []
+            node = current_node
+            while node != NOT_FOUND:
+                path.append(node)
+                node = parent[node]
+            paths[current_node] = (path, current_weight)
+            continue
+
         # Explore adjacent territories
-        for adjacent_territory in game.state.map.get_adjacent_to(current_node):
-            if adjacent_territory in banned:
+        for adjacent_territory in adjacent_list[current_node]:
+            if banned_mask >> adjacent_territory & 1:
                 continue
-            weight = current_weight + get_territory_weight_wrt_cluster(game, adjacent_territory, targets)
-            
+            weight = current_weight + weights[adjacent_territory]
+
             # Only consider this new path if it's better
             if weight < min_weights[adjacent_territory]:
                 min_weights[adjacent_territory] = weight
                 parent[adjacent_territory] = current_node
                 heapq.heappush(priority_queue, (weight, adjacent_territory))
-    
-    # If none of the targets are reachable, return infinity or an appropriate value
-    return [], INF_INT
+
+    return paths
 
 def get_territory_continent(territory: int) -> int:
     cont_first_terr = [0, 9, 16, 28, 32, 38, 42]
@@ -969,12 +2164,7 @@ def get_territory_continent(territory: int) -> int:
     return 99
 
 def get_my_continents(game: Game) -> list[int]:
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    my_continents = set()
-    for i in my_territories:
-        my_continents.add(get_territory_continent(i))
-        
-    return list(my_continents)
+    return get_continent_counters(game).get_continents(game.state.me.player_id)
 
 def get_continent_territory(game: Game, self_state: SelfState) -> list[int]:
     continent_territory = []
@@ -986,20 +2176,15 @@ def get_continent_territory(game: Game, self_state: SelfState) -> list[int]:
     return continent_territory
 
 def get_owned_in_continent(game: Game, continent: int) -> list[int]:
-    all_t = game.state.map.get_continents()[continent]
-    owned_t = game.state.get_territories_owned_by(game.state.me.player_id)
-    return list(set(all_t) & set(owned_t))
+    cont_mask = get_static_map(game).continent[continent]
+    return from_mask(cont_mask & get_owned_mask(game, game.state.me.player_id))
 
 def get_unowned_in_continent(game: Game, continent: int) -> list[int]:
-    all_t = game.state.map.get_continents()[continent]
-    owned_t = game.state.get_territories_owned_by(game.state.me.player_id)
-    return list(set(all_t) - set(owned_t))
+    cont_mask = get_static_map(game).continent[continent]
+    return from_mask(cont_mask & ~get_owned_mask(game, game.state.me.player_id))
 
 def get_continent_percent_owned(game: Game, continent: int) -> float:
-    all_t = game.state.map.get_continents()[continent]
-    owned_t = game.state.get_territories_owned_by(game.state.me.player_id)
-    owned_in_continent = list(set(all_t) & set(owned_t))
-    return float(len(owned_in_continent))/float(len(all_t))
+    return get_continent_counters(game).get_percent_owned(game.state.me.player_id, continent)
 
 def get_cluster_percent_owned_complex(game: Game, cluster: list[int], deployable_troops: int) -> float:
     # Get ratio of owned troops and territory in cluster
@@ -1014,17 +2199,14 @@ def get_cluster_percent_owned_complex(game: Game, cluster: list[int], deployable
     return owned_troops/total_troops
 
 def union_continent_territories(game: Game, territories: list[int], continent: int) -> list[int]:
-    all_t = game.state.map.get_continents()[continent]
-    union_list = list(set(all_t) & set(territories))
-    return union_list
+    return from_mask(get_static_map(game).continent[continent] & to_mask(territories))
 
 def intersect_territories(a: list[int], b:list[int]) -> list[int]:
-    return list(set(a) & set(b))
+    return from_mask(to_mask(a) & to_mask(b))
 
 def get_candidate_attacker(game: Game, self_state: SelfState, continent: int) -> int:
-    border_territories = game.state.get_all_border_territories(
-        game.state.get_territories_owned_by(game.state.me.player_id)
-    )
+    snapshot = get_snapshot(game)
+    border_territories = snapshot.get_border(snapshot.me)
     candidate_attackers = union_continent_territories(game, border_territories, self_state.cur_prio[0])
     if len(candidate_attackers) == 0:
         candidate_attackers = intersect_territories(self_state.out_choke_points[self_state.cur_prio[0]], border_territories)
@@ -1032,12 +2214,10 @@ def get_candidate_attacker(game: Game, self_state: SelfState, continent: int) ->
     return attacker
 
 def get_best_attacker_eliminate(game: Game, player_id: int) -> int:
-    border_territories = game.state.get_all_border_territories(
-        game.state.get_territories_owned_by(game.state.me.player_id)
-    )
-    territories = game.state.get_territories_owned_by(player_id)
-    player_adj_territories = game.state.get_all_adjacent_territories(territories)
-    candidate_attackers = intersect_territories(border_territories, player_adj_territories)
+    snapshot = get_snapshot(game)
+    border_territories = snapshot.get_border(snapshot.me)
+    player_adj_mask = get_static_map(game).get_adjacent_mask(get_owned_mask(game, player_id))
+    candidate_attackers = from_mask(to_mask(border_territories) & player_adj_mask)
 
     if len(candidate_attackers) <= 0:
         return NOT_FOUND
@@ -1047,14 +2227,14 @@ def get_best_attacker_eliminate(game: Game, player_id: int) -> int:
 
 def get_priority_target_cont(game: Game, self_state: SelfState, continent: int):
     #TODO: improve targeting
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    target_candidates = list(set(game.state.map.get_continents()[continent]) & set(game.state.get_all_adjacent_territories(my_territories)))
-    target_candidates = list(set(target_candidates) - set(my_territories))
-    target = target_candidates[0]
+    static_map = get_static_map(game)
+    my_mask = get_owned_mask(game, game.state.me.player_id)
+    target_candidates_mask = static_map.continent[continent] & static_map.get_adjacent_mask(my_mask)
+    target = from_mask(target_candidates_mask)[0]
 
     #how to choose target candidates
-    target_choke = intersect_territories(target_candidates, self_state.in_choke_points[continent])
-    target_non_choke = list(set(target_candidates) - set(target_choke))
+    target_choke = from_mask(target_candidates_mask & self_state.in_choke_masks[continent])
+    target_non_choke = from_mask(target_candidates_mask & ~self_state.in_choke_masks[continent])
     target_non_choke = sorted(target_non_choke, key=lambda x: len(game.state.map.get_adjacent_to(x))) #capture least neighbours
         
     #get non-choke first
@@ -1072,79 +2252,61 @@ def get_priority_target_elim(game: Game, self_state: SelfState, attacker: int, t
     return target
 
 def get_adjacent_enemy_territories(game: Game, self_state: SelfState, territory: int) -> list[int]:
-    adjacent_territory = game.state.map.get_adjacent_to(territory)
-    owned_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-
-    return list(set(adjacent_territory) - set(owned_territories))
+    adjacent_mask = get_static_map(game).adjacent[territory]
+    return from_mask(adjacent_mask & ~get_owned_mask(game, game.state.me.player_id))
 
 def get_adjacent_player_territories(game: Game, territory: int, player_id: int) -> list[int]:
-    adjacent_territory = game.state.map.get_adjacent_to(territory)
-    player_territories = game.state.get_territories_owned_by(player_id)
-
-    return list(set(adjacent_territory) & set(player_territories))
+    adjacent_mask = get_static_map(game).adjacent[territory]
+    return from_mask(adjacent_mask & get_owned_mask(game, player_id))
 
 def get_adjacent_territories_in_cluster(game: Game, territory: int, cluster: list[int]) -> list[int]:
-    adjacent_territory = game.state.map.get_adjacent_to(territory)
+    adjacent_mask = get_static_map(game).adjacent[territory]
     #print('adj_t: ', adjacent_territory, flush=True)
     #print('clt: ', cluster, flush=True)
     #print('result: ', list(set(adjacent_territory) & set(cluster)), flush=True)
-    return list(set(adjacent_territory) & set(cluster))
+    return from_mask(adjacent_mask & to_mask(cluster))
 
 def get_eliminate_player_difficulty_score(game: Game, player_id: int) -> int:
-    #territory_count = len(game.state.get_territories_owned_by(player_id))
-    #TODO: maybe can get from player.troops_remaining?
-    #troop_count = sum([game.state.territories[x].troops for x in game.state.get_territories_owned_by(player_id)])
-    #return troop_count + (territory_count * TERRITORY_SCORE) + ELIM_MOD
-    territories = game.state.get_territories_owned_by(player_id)
+    territories = get_snapshot(game).get_owned(player_id)
     return get_cluster_difficulty_score(game, territories)
 
+# Troops in cards eliminating player_id earns us for every troop the elimination is expected to cost, higher is better
+def get_elimination_value_per_troop(game: Game, player_id: int, difficulty_score: int) -> float:
+    return get_card_counters(game).get_elimination_value(game.state.me.player_id, player_id) / max(difficulty_score, 1)
+
+@profiled('get_player_clusters')
 def get_player_clusters(game: Game, player_id: int) -> list[list[int]]:
-    player_territories = game.state.get_territories_owned_by(player_id)
-        
-    return get_clusters(game, player_territories)
+    return get_mask_clusters(game, get_owned_mask(game, player_id))
 
+@profiled('get_continent_clusters')
 def get_continent_clusters(game: Game, continent_id: int) -> list[list[int]]:
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    continent_territories = game.state.map.get_continents()[continent_id]
-    unowned = list(set(continent_territories) - set(my_territories))
-
-    return get_clusters(game, unowned)
+    cont_mask = get_static_map(game).continent[continent_id]
+    return get_mask_clusters(game, cont_mask & ~get_owned_mask(game, game.state.me.player_id))
 
 def get_clusters(game: Game, territories: list[int]) -> list[list[int]]:
+    return get_mask_clusters(game, to_mask(territories))
+
+def get_mask_clusters(game: Game, territories_mask: int) -> list[list[int]]:
+    """Connected components of territories_mask, each grown frontier by frontier from its lowest territory."""
+    static_map = get_static_map(game)
     clusters = []
-    if len(territories) <=0:
-        return []
-    current = territories[0]
-    unseen = set(territories)
-    unseen.remove(current)
+    unseen = territories_mask
 
     #loop over all clusters
-    while True:
-        cluster = [current]
-        queue = deque()
-        queue.appendleft(current)
-
-        while True:
-            adjacent_friendlies = get_adjacent_territories_in_cluster(game, current, territories)
-            for adjacent in adjacent_friendlies:
-                if adjacent in unseen:
-                    unseen.remove(adjacent)
-                    queue.append(adjacent)
-                    cluster.append(adjacent)
-            if len(queue) <= 0:
-                break
-            current = queue.pop()
-
-        clusters.append(cluster)
-        if len(unseen) <= 0:
-            break
-        current = unseen.pop()
+    while unseen:
+        frontier = unseen & -unseen
+        cluster_mask = frontier
+        while frontier:
+            frontier = static_map.get_adjacent_mask(frontier) & unseen & ~cluster_mask
+            cluster_mask |= frontier
+
+        clusters.append(from_mask(cluster_mask))
+        unseen &= ~cluster_mask
         
     return clusters
 
+@profiled('generate_priority_clusters')
 def generate_priority_clusters(game: Game, self_state: SelfState, deployable_troops: int) -> list[TargetCluster]:
-    start_time = time()
-    print("func_gen_prio_clus_start --- %s seconds ---" % (time() - start_time), flush=True)
 
     result: list[TargetCluster] = []
 
@@ -1152,48 +2314,51 @@ def generate_priority_clusters(game: Game, self_state: SelfState, deployable_tro
     booked_troops_count: dict[int, int] = defaultdict(lambda: 0) #territory id to num. of troops booked
     cur_cluster_id = 0
 
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
+    snapshot = get_snapshot(game)
+    my_territories = snapshot.get_owned(snapshot.me)
     #border_territories = game.state.get_all_border_territories(my_territories)
+    static_map = get_static_map(game)
+    my_mask = snapshot.owned_mask[snapshot.me]
 
     if game.state.card_sets_redeemed > CARDS_REDEEMED_LATE_GAME:
         eliminate_player_difficulty_score = {}
+        elimination_value = {}
         weakest_players = []
         for player in game.state.players.values():
             if player.player_id == game.state.me.player_id or not player.alive:
                 continue # Ignore if player is us or knocked out
 
             difficulty_score = get_eliminate_player_difficulty_score(game, player.player_id)
-            my_troops = get_troops_in_cluster(game, my_territories)
+            my_troops = snapshot.troop_total[snapshot.me]
             if difficulty_score <= my_troops + deployable_troops:
                 weakest_players.append(player.player_id)
                 eliminate_player_difficulty_score[player.player_id] = difficulty_score
-        weakest_players = sorted(weakest_players, key=lambda x: eliminate_player_difficulty_score[x])
+                elimination_value[player.player_id] = get_elimination_value_per_troop(game, player.player_id, difficulty_score)
+        # Cards are what eliminations are for, so the players whose cards come cheapest go first
+        weakest_players = sorted(weakest_players, key=lambda x: (-elimination_value[x], eliminate_player_difficulty_score[x]))
 
         for player_id in weakest_players:
+            # Players are in order of value, so running out of time only drops the least worthwhile ones
+            if self_state.deadline.should_degrade('player cluster path search'):
+                break
             #skip_player_flag = False
             updated_cluster_ids: list[int] = []
-            print("start_get_clusters --- %s seconds ---" % (time() - start_time), flush=True)
             clusters = get_player_clusters(game, player_id)
-            print("end_get_clusters --- %s seconds ---" % (time() - start_time), flush=True)
             for cluster in clusters:
                 #if skip_player_flag:
                 #    break
-                print("start_get_best_path --- %s seconds ---" % (time() - start_time), flush=True)
-                best_path = get_best_path_from_score(game, cluster, set(), booked_troops_count)
-                print("end_get_best_path --- %s seconds ---" % (time() - start_time), flush=True)
-                new_cluster = list(set(cluster).union(set(best_path[0][1:])))
+                best_path = get_best_path_from_score(game, cluster, 0, booked_troops_count)
+                new_cluster = from_mask(to_mask(cluster) | to_mask(best_path[0][1:]))
                 cluster_score = get_cluster_difficulty_score(game, new_cluster) #lower score better
-                #wc_cluster_score = get_cluster_worst_case_difficulty_score(game, cluster) #lower score better
                 cluster_attacker = get_cluster_best_attacker(game, new_cluster)
 
-                print('\ncluster: ', new_cluster, flush=True)
-                print('cluster_score', cluster_score, flush=True)
-                print('attacker', cluster_attacker, flush=True)
+                logger.debug('\ncluster: ', new_cluster)
+                logger.debug('cluster_score', cluster_score)
+                logger.debug('attacker', cluster_attacker)
                 attacker_troops = game.state.territories[cluster_attacker].troops
                 target_cluster = TargetCluster(
                     cur_cluster_id, new_cluster, cluster, cluster_attacker, cluster_score, max(cluster_score-(attacker_troops-booked_troops_count[cluster_attacker]), 0), CL_TYPE_PLAYER
                 )
-                #target_cluster.wc_recommended_troops = max(wc_cluster_score-(attacker_troops-booked_troops_count[cluster_attacker]), 0)
                 
                 cluster_dict[cur_cluster_id] = target_cluster
                 booked_troops_count[cluster_attacker] += cluster_score
@@ -1205,7 +2370,7 @@ def generate_priority_clusters(game: Game, self_state: SelfState, deployable_tro
 
             if sum(cluster_dict[x].recommended_troops for x in updated_cluster_ids) <= deployable_troops:
                 updated_cluster_ids = sorted(updated_cluster_ids, 
-                                             key=lambda x: len(intersect_territories(game.state.get_all_adjacent_territories(cluster_dict[x].cluster), my_territories))
+                                             key=lambda x: (static_map.get_adjacent_mask(to_mask(cluster_dict[x].cluster)) & my_mask).bit_count()
                                             )
                 for id in updated_cluster_ids:
                     cluster_dict[id].commit = True
@@ -1215,7 +2380,6 @@ def generate_priority_clusters(game: Game, self_state: SelfState, deployable_tro
                 for id in updated_cluster_ids:
                     booked_troops_count[cluster_dict[id].attacker] -= cluster_dict[id].difficulty_score
 
-    print("func_done_gen_player_clusters --- %s seconds ---" % (time() - start_time), flush=True)
     ####################################################################################################
     # Create clusters for continents (remake)
     # Check for owned continents
@@ -1264,20 +2428,19 @@ def generate_priority_clusters(game: Game, self_state: SelfState, deployable_tro
     continent_difficulty_score_dict: dict[int, int] = {}
     cluster_troop_diff_dict: dict[int, int] = {}
     continent_cluster_ids_dict: dict[int, list[int]] = {}
-    print('CANDIDATE CONTS: ', candidate_continents, flush=True)
+    logger.debug('CANDIDATE CONTS: ', candidate_continents)
     for continent_id in candidate_continents:
+        # Keep at least one scored continent for the forced attack fallback below
+        if len(continent_cluster_ids_dict) > 0 and self_state.deadline.should_degrade('continent cluster scoring'):
+            break
         updated_cluster_ids: list[int] = []
-        print("start_get_continent_clusters --- %s seconds ---" % (time() - start_time), flush=True)
         clusters = get_continent_clusters(game, continent_id)
-        print("end_get_continent_clusters --- %s seconds ---" % (time() - start_time), flush=True)
         if len(clusters) <= 0:
             continue
 
         for cluster in clusters:
-            print("start_get_best_path --- %s seconds ---" % (time() - start_time), flush=True)
-            best_path = get_best_path_from_score(game, cluster, set(), booked_troops_count)
-            print("end_get_best_path_clusters --- %s seconds ---" % (time() - start_time), flush=True)
-            new_cluster = list(set(cluster).union(set(best_path[0][1:])))
+            best_path = get_best_path_from_score(game, cluster, 0, booked_troops_count)
+            new_cluster = from_mask(to_mask(cluster) | to_mask(best_path[0][1:]))
             cluster_score = get_cluster_difficulty_score(game, new_cluster) #lower score better
             cluster_attacker = get_cluster_best_attacker(game, new_cluster)
             attacker_troops = game.state.territories[cluster_attacker].troops
@@ -1286,27 +2449,22 @@ def generate_priority_clusters(game: Game, self_state: SelfState, deployable_tro
             )
             cluster_troop_diff_dict[cur_cluster_id] = cluster_score-(attacker_troops-booked_troops_count[cluster_attacker])
             target_cluster.continent = continent_id
-            print('\ncont cluster: ', new_cluster, flush=True)
-            print('cluster_score', cluster_score, flush=True)
-            print('attacker', cluster_attacker, flush=True)
+            logger.debug('\ncont cluster: ', new_cluster)
+            logger.debug('cluster_score', cluster_score)
+            logger.debug('attacker', cluster_attacker)
 
             #continent_hold_difficulty = 0
             if game.state.card_sets_redeemed <= CARDS_REDEEMED_LATE_GAME:
-                adjacent_to_cluster = game.state.get_all_adjacent_territories(cluster)
-                out_choke_adjacent_to_cluster = intersect_territories(self_state.out_choke_points[continent_id], adjacent_to_cluster)
-                for c in out_choke_adjacent_to_cluster:
-                    if game.state.territories[c].occupier != game.state.me.player_id:
-                        adjacent_in_chokes = get_adjacent_territories_in_cluster(game, c, game.state.map.get_continents()[continent_id])
-                        defended = True
-                        for in_chokes in adjacent_in_chokes:
-                            if game.state.territories[in_chokes].occupier != game.state.me.player_id:
-                                defended = False
-                        
-                        if not defended:
-                            #TODO: Add logic to consider amount of troops enemies will get next turn
-                            target_cluster.difficulty_score += game.state.territories[c].troops - 1
-                            target_cluster.recommended_troops = max(target_cluster.difficulty_score-(attacker_troops-booked_troops_count[cluster_attacker]), 0)
-                            cluster_troop_diff_dict[cur_cluster_id] = target_cluster.difficulty_score-(attacker_troops-booked_troops_count[cluster_attacker])
+                out_choke_adjacent_to_cluster_mask = self_state.out_choke_masks[continent_id] & static_map.get_adjacent_mask(to_mask(cluster))
+                for c in from_mask(out_choke_adjacent_to_cluster_mask & ~my_mask):
+                    adjacent_in_chokes_mask = static_map.adjacent[c] & static_map.continent[continent_id]
+                    defended = adjacent_in_chokes_mask & ~my_mask == 0
+                    
+                    if not defended:
+                        #TODO: Add logic to consider amount of troops enemies will get next turn
+                        target_cluster.difficulty_score += game.state.territories[c].troops - 1
+                        target_cluster.recommended_troops = max(target_cluster.difficulty_score-(attacker_troops-booked_troops_count[cluster_attacker]), 0)
+                        cluster_troop_diff_dict[cur_cluster_id] = target_cluster.difficulty_score-(attacker_troops-booked_troops_count[cluster_attacker])
 
             cluster_dict[cur_cluster_id] = target_cluster
             #booked_troops_count[cluster_attacker] += cluster_score
@@ -1337,15 +2495,15 @@ def generate_priority_clusters(game: Game, self_state: SelfState, deployable_tro
         continent_cluster_ids_dict[continent_id] = updated_cluster_ids
     
     candidate_target_continents = sorted(list(continent_difficulty_score_dict.keys()), key=lambda x: continent_difficulty_score_dict[x])
-    print('CLUSTER TROOP DIFF DICT: ', cluster_troop_diff_dict, flush=True)
-    print('CONT DIFFSCORE: ', continent_difficulty_score_dict, flush=True)
-    print('CANDIDATE TARGET CONTS: ', candidate_target_continents, flush=True)
+    logger.debug('CLUSTER TROOP DIFF DICT: ', cluster_troop_diff_dict)
+    logger.debug('CONT DIFFSCORE: ', continent_difficulty_score_dict)
+    logger.debug('CANDIDATE TARGET CONTS: ', candidate_target_continents)
 
     # Recalculate difficulty to account for troop booking
     # Need to recalculate after sorting target continents w/ regards to priority
     for continent_id in candidate_target_continents:
         continent_cluster_ids_dict[continent_id] = sorted(continent_cluster_ids_dict[continent_id], 
-                                    key=lambda x: len(intersect_territories(game.state.get_all_adjacent_territories(cluster_dict[x].cluster), my_territories))
+                                    key=lambda x: (static_map.get_adjacent_mask(to_mask(cluster_dict[x].cluster)) & my_mask).bit_count()
                                     )
         for id in continent_cluster_ids_dict[continent_id]:
             cluster_score = cluster_dict[id].difficulty_score
@@ -1386,7 +2544,7 @@ def generate_priority_clusters(game: Game, self_state: SelfState, deployable_tro
             for territory in cont_in_chokes:
                 print('disrupt: ', territory, flush=True)
                 print("dist_time --- %s seconds ---" % (time() - start_time), flush=True)
-                best_path = get_best_path_from_score(game, cluster, set(game.state.map.get_continents()[continent_id]), booked_troops_count)
+                best_path = get_best_path_from_score(game, cluster, get_static_map(game).continent[continent_id], booked_troops_count)
                 new_cluster = list(set(cluster).union(set(best_path[0][1:])))
                 cluster_score = get_cluster_difficulty_score(game, new_cluster) #lower score better
                 if cluster_score < lowest_diff_score:
@@ -1410,7 +2568,7 @@ def generate_priority_clusters(game: Game, self_state: SelfState, deployable_tro
     for continent_id in remaining_continents:
         if len(get_players_in_continent(game, continent_id)) <= 1 and get_continent_percent_owned(game, continent_id) >= 1.0:
             #my_adjacent_territories = get_cluster_adjacent_friendly(game, game.state.map.get_continents()[continent_id])
-            candidate_targets = intersect_territories(game.state.get_all_adjacent_territories(my_territories), game.state.map.get_continents()[continent_id])
+            candidate_targets = from_mask(static_map.get_adjacent_mask(my_mask) & static_map.continent[continent_id])
             if len(candidate_targets) <= 0:
                 continue
             least_troops_target = min(candidate_targets, key=lambda x: game.state.territories[x].troops)
@@ -1448,20 +2606,59 @@ def generate_priority_clusters(game: Game, self_state: SelfState, deployable_tro
         #    for id in updated_cluster_ids:
         #        booked_troops_count[cluster_dict[id].attacker] -= cluster_dict[id].difficulty_score
 
-    print("func_done_gen_continent_clusters --- %s seconds ---" % (time() - start_time), flush=True)
+
+    return result
+
+# Returns what is left of target_cluster after conquered changed hands to us in an attack from attacking.
+# Only clusters touching either territory are rebuilt, each remaining connected piece becomes its own cluster.
+# booked_troops_count: troops clusters before this one booked on each attacker, updated with this cluster's pieces
+# next_id: id for the second piece onwards if the cluster splits, the first keeps target_cluster.id
+@profiled('update_target_cluster')
+def update_target_cluster(game: Game, target_cluster: TargetCluster, attacking: int, conquered: int, booked_troops_count: dict[int, int], next_id: int) -> list[TargetCluster]:
+    if len(target_cluster.cluster) <= 0:
+        return []
+
+    static_map = get_static_map(game)
+    cluster_mask = to_mask(target_cluster.cluster)
+    touched_mask = cluster_mask | static_map.get_adjacent_mask(cluster_mask)
+    if target_cluster.attacker != attacking and not touched_mask >> conquered & 1:
+        booked_troops_count[target_cluster.attacker] += target_cluster.difficulty_score
+        return [target_cluster]
+
+    conquered_mask = 1 << conquered
+    ori_mask = to_mask(target_cluster.ori_cluster) & ~conquered_mask
+    result: list[TargetCluster] = []
+    for cluster in get_mask_clusters(game, cluster_mask & ~conquered_mask):
+        # Path territories cut off from the original cluster are no longer needed
+        if to_mask(cluster) & ori_mask == 0:
+            continue
+        cluster_attacker = get_cluster_best_attacker(game, cluster)
+        if cluster_attacker == NOT_FOUND:
+            continue
+        cluster_score = get_cluster_difficulty_score(game, cluster)
+        attacker_troops = game.state.territories[cluster_attacker].troops
+        piece_id = target_cluster.id if len(result) <= 0 else next_id + len(result) - 1
+        piece = TargetCluster(
+            piece_id, cluster, from_mask(to_mask(cluster) & ori_mask), cluster_attacker, cluster_score, max(cluster_score-(attacker_troops-booked_troops_count[cluster_attacker]), 0), target_cluster.type
+        )
+        booked_troops_count[cluster_attacker] += cluster_score
+        piece.commit = target_cluster.commit
+        piece.continent = target_cluster.continent
+        result.append(piece)
 
     return result
 
 def get_troops_in_cluster(game: Game, cluster: list[int]) -> int:
-    return sum([game.state.territories[x].troops for x in cluster])
+    troops = get_snapshot(game).troops
+    return sum([troops[x] for x in cluster])
 
 def get_most_troops_in_cluster(game: Game, cluster: list[int]) -> int:
-    return max(cluster, key=lambda x: game.state.territories[x].troops)
+    troops = get_snapshot(game).troops
+    return max(cluster, key=lambda x: troops[x])
 
 def get_cluster_adjacent_friendly(game: Game, cluster: list[int]) -> list[int]:
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    cluster_adjacent = game.state.get_all_adjacent_territories(cluster)
-    return intersect_territories(my_territories, cluster_adjacent)
+    cluster_adjacent_mask = get_static_map(game).get_adjacent_mask(to_mask(cluster))
+    return from_mask(cluster_adjacent_mask & get_owned_mask(game, game.state.me.player_id))
 
 #assumes cluster has adjacent friendly territory
 def get_cluster_best_attacker(game: Game, cluster: list[int]) -> int:
@@ -1470,108 +2667,133 @@ def get_cluster_best_attacker(game: Game, cluster: list[int]) -> int:
         return NOT_FOUND
     return get_most_troops_in_cluster(game, candidates)
 
-def get_cluster_difficulty_score(game: Game, cluster: list[int]) -> int:
-    score = ELIM_MOD
-    nodes = 0
-    for territory in cluster:
-        nodes += 1
-        troop_count = game.state.territories[territory].troops
-        if troop_count == 1 or nodes <= 1:
-            score += troop_count
-        else:
-            score += troop_count + TERRITORY_SCORE
-    return score
+def get_cluster_attack_order(game: Game, cluster: list[int], attacker: int) -> tuple[int, ...]:
+    return get_static_map(game).get_attack_order(to_mask(cluster), attacker)
 
-"""
-def get_cluster_worst_case_difficulty_score(game: Game, cluster: list[int]) -> int:
-    score = ELIM_MOD_WORST
-    
-    for territory in cluster:
-        troop_count = game.state.territories[territory].troops
-        if troop_count == 1:
-            score += troop_count
-        else:
-            score += troop_count + TERRITORY_SCORE
-    return score
-"""
+# Troops our best attacker needs to sweep cluster, lower is easier
+# attacker: territory to sweep from instead of the best one on the current board
+def get_cluster_difficulty_score(game: Game, cluster: list[int], attacker: Optional[int] = None) -> int:
+    troops = get_snapshot(game).troops
+    if attacker == None:
+        attacker = get_cluster_best_attacker(game, cluster)
+    order = get_cluster_attack_order(game, cluster, attacker)
+    return sweep_estimator.get_troops_needed(tuple(troops[x] for x in order))
 
 def is_target_cut_node(game: Game, cluster: list[int], target: int) -> bool:
     if target not in cluster:
         return False
     
-    adjacent_territories = game.state.map.get_adjacent_to(target)
-    adjacent_cluster_territories = intersect_territories(cluster, adjacent_territories)
+    return get_static_map(game).get_cut_mask(to_mask(cluster)) >> target & 1 == 1
 
-    if len(adjacent_cluster_territories) <= 1:
-        return False
-    tmp_cluster = cluster[:]
-    tmp_cluster.remove(target)
-
-    clusters = get_clusters(game, tmp_cluster)
-
-    if len(clusters) <=1:
-        return False
-    
-    return True
-
-def sort_attack_priority(game: Game, cluster: list[int], candidate_targets: list[int]) -> list[int]:
+# Without use_cut_nodes targets are only ordered by how many cluster territories they touch
+@profiled('sort_attack_priority')
+def sort_attack_priority(game: Game, cluster: list[int], candidate_targets: list[int], use_cut_nodes: bool = True) -> list[int]:
     is_cut_node: list[int] = []
     is_not_cut_node: list[int] = []
     #for target in candidate_targets:
     #    is_cut_node = is_target_cut_node(game, cluster, target)
     #    adjacent_to_target = game.state.map.get_adjacent_to(target)
     
-    sorted_targets = sorted(candidate_targets, key= lambda x: len(intersect_territories(game.state.map.get_adjacent_to(x), cluster)))
+    static_map = get_static_map(game)
+    cluster_mask = to_mask(cluster)
+    cut_mask = static_map.get_cut_mask(cluster_mask) if use_cut_nodes else 0
+    sorted_targets = sorted(candidate_targets, key= lambda x: (static_map.adjacent[x] & cluster_mask).bit_count())
     for target in sorted_targets:
-        if is_target_cut_node(game, cluster, target):
+        if cut_mask >> target & 1:
             is_cut_node.append(target)
         else:
             is_not_cut_node.append(target)
 
-    print('sort_prio_cluster: ', cluster, flush=True)
-    print('is_not_cut_node: ', is_cut_node, flush=True)
-    print('is_cut: ', is_cut_node, flush=True)
+    logger.debug('sort_prio_cluster: ', cluster)
+    logger.debug('is_not_cut_node: ', is_cut_node)
+    logger.debug('is_cut: ', is_cut_node)
     
     return is_not_cut_node + is_cut_node
 
-def get_path_score(game: Game, path: list[int], path_score: int) -> int:
+# Troops path[0] has left over after sweeping the rest of path, negative if it falls short
+def get_path_score(game: Game, path: list[int]) -> int:
     if len(path) <= 0:
         return NEG_INF_INT
-    #print(path, ':', path_score)
-    return game.state.territories[path[0]].troops - path_score
-
-def get_best_path_from_score(game: Game, cluster: list[int], banned: set[int], booked_troops_count: dict[int, int]) -> tuple[list[int], int]:
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    border_territories = game.state.get_all_border_territories(my_territories)
+    troops = get_snapshot(game).troops
+    return troops[path[0]] - sweep_estimator.get_troops_needed(tuple(troops[x] for x in path[1:]))
+
+# troops split over dstrbs proportionally to difficulty score, rounding down, with what is left going to dstrbs[remainder_index]
+def get_proportional_split(dstrbs: list[TargetCluster], troops: int, remainder_index: int) -> list[int]:
+    total_difficulty = sum(dstrb.difficulty_score for dstrb in dstrbs)
+    split = [(troops*dstrb.difficulty_score)//total_difficulty if total_difficulty > 0 else 0 for dstrb in dstrbs]
+    split[remainder_index] += troops - sum(split)
+    return split
+
+# Splits troops over dstrbs, picking whichever candidate split sweeps the most clusters in simulation.
+# base_troops: troops each attacker will have before the split. Falls back to the proportional split when short on time.
+@profiled('choose_troop_split')
+def choose_troop_split(game: Game, self_state: SelfState, dstrbs: list[TargetCluster], troops: int, base_troops: dict[int, int], remainder_index: int) -> list[int]:
+    proportional_split = get_proportional_split(dstrbs, troops, remainder_index)
+    if len(dstrbs) <= 1 or troops <= 0 or self_state.deadline.should_degrade('troop split simulation'):
+        return proportional_split
+
+    # Candidates: the proportional split, everything on one cluster, and filling the largest shortfalls first
+    candidates = [proportional_split]
+    for i in range(len(dstrbs)):
+        candidates.append([troops if x == i else 0 for x in range(len(dstrbs))])
+    shortfall_split = [0] * len(dstrbs)
+    remaining_troops = troops
+    stack = dict(base_troops)
+    for i in sorted(range(len(dstrbs)), key=lambda x: dstrbs[x].difficulty_score - stack[dstrbs[x].attacker]):
+        needed = max(dstrbs[i].difficulty_score - stack[dstrbs[i].attacker], 0)
+        shortfall_split[i] = min(needed, remaining_troops)
+        stack[dstrbs[i].attacker] += shortfall_split[i]
+        remaining_troops -= shortfall_split[i]
+    shortfall_split[remainder_index] += remaining_troops
+    candidates.append(shortfall_split)
+
+    troops_map = get_snapshot(game).troops
+    orders = [tuple(troops_map[x] for x in get_cluster_attack_order(game, dstrb.cluster, dstrb.attacker)) for dstrb in dstrbs]
+    candidate_plans: list[list[tuple[int, tuple[int, ...]]]] = []
+    for split in candidates:
+        stack = dict(base_troops)
+        for dstrb, bonus_troops in zip(dstrbs, split):
+            stack[dstrb.attacker] += bonus_troops
+        candidate_plans.append([(stack[dstrb.attacker], order) for dstrb, order in zip(dstrbs, orders)])
+
+    # Candidates mostly share plans, simulate each distinct one once
+    plans = list(dict.fromkeys(plan for candidate in candidate_plans for plan in candidate))
+    success = dict(zip(plans, sweep_simulator.simulate(plans, len(game.state.recording))))
+    scores = [sum(success[plan] for plan in candidate) for candidate in candidate_plans]
+    logger.debug('split candidates: ', candidates, ' | expected sweeps: ', scores)
+
+    best = max(range(len(candidates)), key=lambda x: scores[x])
+    if scores[best] - scores[0] < SIMULATION_MIN_GAIN:
+        return proportional_split
+    return candidates[best]
+
+@profiled('get_best_path_from_score')
+def get_best_path_from_score(game: Game, cluster: list[int], banned_mask: int, booked_troops_count: dict[int, int]) -> tuple[list[int], int]:
+    snapshot = get_snapshot(game)
+    border_territories = snapshot.get_border(snapshot.me)
 
     # Check if adjacent territories are good enough
-    adjacent_to_cluster = intersect_territories(game.state.get_all_adjacent_territories(cluster), border_territories)
+    adjacent_to_cluster = from_mask(get_static_map(game).get_adjacent_mask(to_mask(cluster)) & to_mask(border_territories))
     adjacent_to_cluster = sorted(adjacent_to_cluster, key=lambda x: game.state.territories[x].troops)
-    for territory in adjacent_to_cluster:
+    cluster_attacker = get_cluster_best_attacker(game, cluster)
+    if len(adjacent_to_cluster) > 0 and cluster_attacker != NOT_FOUND:
         cluster_score = get_cluster_difficulty_score(game, cluster)
-        cluster_attacker = get_cluster_best_attacker(game, cluster)
-        if cluster_attacker == NOT_FOUND:
-            continue
         attacker_troops = game.state.territories[cluster_attacker].troops
         if cluster_score <= (attacker_troops-booked_troops_count[cluster_attacker]):
-            return ([territory]+cluster, 0)
+            return ([adjacent_to_cluster[0]]+cluster, 0)
 
 
-    tmp: list[tuple[list[int], int]] = []
-    path_tuple = get_best_path_to_cluster(game, cluster, border_territories, banned)
-    tmp.append(path_tuple)
-    #if len(path_tuple[0]) > 0:
-    #    adjacent_borders = get_adjacent_player_territories(game, path_tuple[0][0], game.state.me.player_id)
-    #    tmp.append(get_best_path_to_cluster(game, cluster, adjacent_borders, set(my_territories) - set(adjacent_borders) - banned))
-    most_troops_territory = max(border_territories, key=lambda x: game.state.territories[x].troops)
-    tmp.append(get_best_path_to_cluster(game, cluster, [most_troops_territory], set(my_territories) - {most_troops_territory} - banned))
+    # One search gives the best path from every border territory, ordered by territory id for stable ties
+    paths = get_best_paths_to_cluster(game, cluster, border_territories, banned_mask)
+    tmp: list[tuple[list[int], int]] = [paths[target] for target in sorted(paths)]
+    if len(tmp) == 0:
+        return ([], INF_INT)
 
-    for tpl in tmp:
-        print('\nori-cluster: ', cluster, flush=True)
-        print('score candidates: ', tpl, flush=True)
+    logger.debug('\nori-cluster: ', cluster)
+    logger.debug('score candidates: ', tmp)
 
-    # get_path_score subtracts attacker troops with difficulty score, sort to get highest
-    best_path = max(tmp, key=lambda x: get_path_score(game, x[0], x[1]))
+    # get_path_score subtracts the troops the sweep needs from attacker troops, pick the highest
+    best_path = max(tmp, key=lambda x: get_path_score(game, x[0]))
     return best_path
 
 def get_highest_priority_starting_territory(game: Game, self_state: SelfState, unclaimed_candidates: list[int], prio_conts: set) -> tuple[int, int]:
@@ -1579,16 +2801,15 @@ def get_highest_priority_starting_territory(game: Game, self_state: SelfState, u
     #adj_cont = self_state.cont_adj[cont]
     #in_choke = self_state.in_choke_points[cont]
 
-    my_territories = game.state.get_territories_owned_by(game.state.me.player_id)
-    adjacent_territories = game.state.get_all_adjacent_territories(my_territories)
+    static_map = get_static_map(game)
+    adjacent_mask = static_map.get_adjacent_mask(get_owned_mask(game, game.state.me.player_id))
     my_continents = get_my_continents(game) # All continents in owned continents
-    unclaimed_territories = game.state.get_territories_owned_by(None)
+    unclaimed_mask = get_owned_mask(game, None)
 
     overpop_cont = set()
     non_empty_cont = set()
     for i in range(6):
-        cont_terr = game.state.map.get_continents()[i]
-        cont_available = intersect_territories(cont_terr, unclaimed_territories)
+        cont_mask = static_map.continent[i]
         enemy_count = len(get_players_in_continent(game, i))
 
         if i in my_continents:
@@ -1596,52 +2817,48 @@ def get_highest_priority_starting_territory(game: Game, self_state: SelfState, u
         if enemy_count >= 2:
             overpop_cont.add(i)
 
-        if len(cont_available) != len(cont_terr):
+        if cont_mask & unclaimed_mask != cont_mask:
             non_empty_cont.add(i)
 
-    prio_adj_out_choke = [] # adjacent continent's out-choke where there are other players
+    prio_adj_out_choke = 0 # adjacent continent's out-choke where there are other players
     for nec in non_empty_cont:
-        prio_adj_out_choke = prio_adj_out_choke + self_state.out_choke_points[nec]
+        prio_adj_out_choke |= self_state.out_choke_masks[nec]
 
-    prio_in_choke = [] # in-choke of my continent
+    prio_in_choke = 0 # in-choke of my continent
     for pc in prio_conts:
-        prio_in_choke = self_state.in_choke_points[pc]
+        prio_in_choke = self_state.in_choke_masks[pc]
 
-    prio_out_choke = [] # out-choke of my continent
+    prio_out_choke = 0 # out-choke of my continent
     for pc in prio_conts:
-       prio_in_choke = self_state.in_choke_points[pc]
+       prio_in_choke = self_state.in_choke_masks[pc]
 
     candidate_score = {}
     for territory in unclaimed_candidates:
         territory_continent = get_territory_continent(territory)
+        territory_mask = 1 << territory
         
-        if territory in prio_in_choke and territory in prio_adj_out_choke:
+        if territory_mask & prio_in_choke and territory_mask & prio_adj_out_choke:
             candidate_score[territory] = 6
-        elif territory in prio_in_choke:
+        elif territory_mask & prio_in_choke:
             candidate_score[territory] = 5
-        elif territory_continent in my_continents and territory in adjacent_territories:
+        elif territory_continent in my_continents and territory_mask & adjacent_mask:
             candidate_score[territory] = 4
         elif territory_continent in my_continents:
             candidate_score[territory] = 3
-        elif territory in prio_out_choke:
+        elif territory_mask & prio_out_choke:
             candidate_score[territory] = 2
-        elif territory in adjacent_territories:
+        elif territory_mask & adjacent_mask:
             candidate_score[territory] = 1
         else:
             candidate_score[territory] = NOT_FOUND
 
     top_candidate = sorted(unclaimed_candidates, key=lambda x: candidate_score[x], reverse=True)[0]
-    print('top_c: ', top_candidate, flush=True)
-    print('score: ', candidate_score[top_candidate], flush=True)
+    logger.debug('top_c: ', top_candidate)
+    logger.debug('score: ', candidate_score[top_candidate])
     return top_candidate, candidate_score[top_candidate]
 
 def get_players_in_continent(game: Game, cont: int) -> set[int]:
-    result = set()
-    cont_territories = game.state.map.get_continents()[cont]
-    for t in cont_territories:
-        if game.state.territories[t].occupier != None:
-            result.add(game.state.territories[t].occupier)
-    return result
+    return get_continent_counters(game).get_players(cont)
 
 def get_num_remaining_player(game: Game) -> int:
     count = 0
@@ -1653,7 +2870,7 @@ def get_num_remaining_player(game: Game) -> int:
 def get_strongest_player(game: Game) -> int:
     total_troops_per_player = {}
     for player in game.state.players.values():
-        total_troops_per_player[player.player_id] = sum([game.state.territories[x].troops for x in game.state.get_territories_owned_by(player.player_id)])
+        total_troops_per_player[player.player_id] = get_snapshot(game).troop_total[player.player_id]
 
     most_powerful_player = max(total_troops_per_player.items(), key=lambda x: x[1])[0]
     return most_powerful_player
@@ -0,0 +1,822 @@
+"""Offline stand-in for the Bot Battle engine.
+
+Runs a full game in-process with a seeded RNG, speaking the same query/move protocol as
+risk_helper: the bot's handle_* functions receive queries and answer with game.move_* calls.
+Every state change is a record appended to the recording, so a saved recording can be
+replayed onto a fresh board without the RNG.
+
+Usage:
+    python local_engine.py --seed 1 gacha-v2-4.py random random random random
+"""
+import argparse
+import ast
+import contextlib
+import importlib.util
+import itertools
+import json
+import os
+import random
+from typing import Optional
+
+
+NUM_PLAYERS = 5
+INITIAL_TROOPS = {2: 40, 3: 35, 4: 30, 5: 25, 6: 20}
+MIN_TURN_TROOPS = 3
+TERRITORIES_PER_TROOP = 3
+MAX_HAND_SIZE = 5 # Players holding this many cards must redeem down below it
+CARD_SET_VALUES = [4, 6, 8, 10, 12, 15]
+CARD_SET_INCREMENT = 5 # Value added per set once CARD_SET_VALUES runs out
+MATCHING_TERRITORY_BONUS = 2
+MAX_ATTACK_DICE = 3
+MAX_DEFEND_DICE = 2
+MAX_TURNS = 500 # Turns (of any player) before the game is called
+
+CARD_SYMBOLS = ["Infantry", "Cavalry", "Artillery"]
+WILDCARD = "Wildcard"
+WILDCARD_COUNT = 2
+
+# Standard map, numbered the same way as the engine
+EDGES = [
+    (0, 1), (0, 5), (0, 21), (1, 5), (1, 6), (1, 8), (2, 3), (2, 8), (2, 30), (3, 6), (3, 7), (3, 8),
+    (4, 5), (4, 6), (4, 7), (4, 10), (5, 6), (6, 7), (6, 8),
+    (9, 10), (9, 11), (9, 12), (9, 15), (10, 12), (11, 12), (11, 13), (11, 14), (11, 15), (12, 14),
+    (13, 14), (13, 15), (13, 34), (13, 36), (13, 22), (14, 16), (14, 26), (14, 22), (15, 36),
+    (16, 17), (16, 18), (16, 22), (16, 26), (17, 18), (17, 23), (17, 24), (17, 25), (17, 26), (18, 22),
+    (18, 24), (19, 21), (19, 23), (19, 25), (19, 27), (20, 21), (20, 23), (21, 23), (21, 27), (22, 34),
+    (22, 33), (24, 40), (25, 26), (25, 27), (25, 23),
+    (32, 33), (32, 36), (32, 37), (33, 34), (33, 35), (33, 36), (33, 37), (34, 36), (35, 37), (36, 29),
+    (28, 29), (28, 31), (29, 31), (29, 30), (31, 30),
+    (38, 39), (38, 41), (40, 39), (40, 41), (39, 41),
+]
+CONTINENTS = {
+    0: list(range(0, 9)), # North America
+    1: list(range(9, 16)), # Europe
+    2: list(range(16, 28)), # Asia
+    3: list(range(28, 32)), # South America
+    4: list(range(32, 38)), # Africa
+    5: list(range(38, 42)), # Australia
+}
+CONTINENT_BONUSES = {0: 5, 1: 5, 2: 7, 3: 2, 4: 3, 5: 2}
+NUM_TERRITORIES = 42
+
+# Handler called for each query type, named as in the bot scripts
+QUERY_HANDLERS = {
+    "claim_territory": "handle_claim_territory",
+    "place_initial_troop": "handle_place_initial_troop",
+    "redeem_cards": "handle_redeem_cards",
+    "distribute_troops": "handle_distribute_troops",
+    "attack": "handle_attack",
+    "troops_after_attack": "handle_troops_after_attack",
+    "defend": "handle_defend",
+    "fortify": "handle_fortify",
+}
+
+
+class IllegalMoveError(Exception):
+    def __init__(self, player_id: int, move, reason: str):
+        super().__init__(f"player {player_id}: {reason} ({move!r})")
+        self.player_id = player_id
+        self.move = move
+        self.reason = reason
+
+
+class LocalMap():
+    def __init__(self):
+        self.adjacent: dict[int, list[int]] = {x: [] for x in range(NUM_TERRITORIES)}
+        for a, b in EDGES:
+            self.adjacent[a].append(b)
+            self.adjacent[b].append(a)
+
+    def get_vertices(self) -> list[int]:
+        return list(range(NUM_TERRITORIES))
+
+    def get_adjacent_to(self, territory: int) -> list[int]:
+        return list(self.adjacent[territory])
+
+    def get_continents(self) -> dict[int, list[int]]:
+        return {cont: list(territories) for cont, territories in CONTINENTS.items()}
+
+    def get_continent_bonuses(self) -> dict[int, int]:
+        return dict(CONTINENT_BONUSES)
+
+
+class LocalTerritory():
+    def __init__(self, territory_id: int):
+        self.territory_id: int = territory_id
+        self.occupier: Optional[int] = None
+        self.troops: int = 0
+
+
+class LocalCard():
+    def __init__(self, card_id: int, territory_id: Optional[int], symbol: str):
+        self.card_id: int = card_id
+        self.territory_id: Optional[int] = territory_id
+        self.symbol: str = symbol
+
+    def __repr__(self):
+        return f"LocalCard({self.card_id}, {self.territory_id}, {self.symbol})"
+
+
+class LocalPlayer():
+    def __init__(self, player_id: int):
+        self.player_id: int = player_id
+        self.alive: bool = True
+        self.troops_remaining: int = 0
+        self.cards: list[LocalCard] = []
+        self.must_place_territory_bonus: list[int] = []
+
+    @property
+    def card_count(self) -> int:
+        return len(self.cards)
+
+
+def is_card_set(cards) -> bool:
+    # Three of a kind, one of each, or anything with a wildcard
+    wildcards = len([card for card in cards if card.symbol == WILDCARD])
+    symbols = set(card.symbol for card in cards if card.symbol != WILDCARD)
+    return wildcards > 0 or len(symbols) in (1, 3)
+
+def get_card_set_value(sets_redeemed: int) -> int:
+    if sets_redeemed < len(CARD_SET_VALUES):
+        return CARD_SET_VALUES[sets_redeemed]
+    return CARD_SET_VALUES[-1] + CARD_SET_INCREMENT * (sets_redeemed - len(CARD_SET_VALUES) + 1)
+
+
+# Queries, with the same query_type and fields as risk_shared
+class LocalQuery():
+    query_type: str = ""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.__dict__})"
+
+class QueryClaimTerritory(LocalQuery):
+    query_type = "claim_territory"
+
+class QueryPlaceInitialTroop(LocalQuery):
+    query_type = "place_initial_troop"
+
+class QueryRedeemCards(LocalQuery):
+    query_type = "redeem_cards"
+
+class QueryDistributeTroops(LocalQuery):
+    query_type = "distribute_troops"
+
+class QueryAttack(LocalQuery):
+    query_type = "attack"
+
+class QueryTroopsAfterAttack(LocalQuery):
+    query_type = "troops_after_attack"
+
+class QueryDefend(LocalQuery):
+    query_type = "defend"
+
+class QueryFortify(LocalQuery):
+    query_type = "fortify"
+
+
+# Records and moves, with the same record_type and fields as risk_shared
+class LocalRecord():
+    record_type: str = ""
+    fields: tuple[str, ...] = ()
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.fields, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.fields)})"
+
+    def to_dict(self) -> dict:
+        result = {"record_type": self.record_type}
+        for name in self.fields:
+            result[name] = getattr(self, name)
+        return result
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LocalRecord":
+        return cls(**{name: data[name] for name in cls.fields})
+
+class RecordStartGame(LocalRecord):
+    record_type = "start_game"
+    fields = ("turn_order", "initial_troops")
+
+class RecordStartTurn(LocalRecord):
+    record_type = "start_turn"
+    fields = ("player", "territories_held", "continents_held", "territory_bonus", "continent_bonus")
+
+class RecordAttack(LocalRecord):
+    record_type = "attack"
+    fields = ("move_attack_id", "move_defend_id", "attacking_troops_lost", "defending_troops_lost", "territory_conquered", "defender_eliminated")
+
+class RecordPlayerEliminated(LocalRecord):
+    record_type = "player_eliminated"
+    fields = ("player", "record_attack_id", "cards_surrendered")
+
+class RecordDrewCard(LocalRecord):
+    record_type = "drew_card"
+    fields = ("player", "card")
+
+class MoveClaimTerritory(LocalRecord):
+    record_type = "move_claim_territory"
+    fields = ("move_by_player", "territory")
+
+class MovePlaceInitialTroop(LocalRecord):
+    record_type = "move_place_initial_troop"
+    fields = ("move_by_player", "territory")
+
+class MoveRedeemCards(LocalRecord):
+    record_type = "move_redeem_cards"
+    fields = ("move_by_player", "sets", "cause")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LocalRecord":
+        return cls(data["move_by_player"], [tuple(card_set) for card_set in data["sets"]], data["cause"])
+
+class MoveDistributeTroops(LocalRecord):
+    record_type = "move_distribute_troops"
+    fields = ("move_by_player", "distributions", "cause")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LocalRecord":
+        # JSON object keys are always strings
+        return cls(data["move_by_player"], {int(x): n for x, n in data["distributions"].items()}, data["cause"])
+
+class MoveAttack(LocalRecord):
+    record_type = "move_attack"
+    fields = ("move_by_player", "attacking_territory", "defending_territory", "attacking_troops")
+
+class MoveAttackPass(LocalRecord):
+    record_type = "move_attack_pass"
+    fields = ("move_by_player",)
+
+class MoveDefend(LocalRecord):
+    record_type = "move_defend"
+    fields = ("move_by_player", "move_attack_id", "defending_troops")
+
+class MoveTroopsAfterAttack(LocalRecord):
+    record_type = "move_troops_after_attack"
+    fields = ("move_by_player", "record_attack_id", "troop_count")
+
+class MoveFortify(LocalRecord):
+    record_type = "move_fortify"
+    fields = ("move_by_player", "source_territory", "target_territory", "troop_count")
+
+class MoveFortifyPass(LocalRecord):
+    record_type = "move_fortify_pass"
+    fields = ("move_by_player",)
+
+RECORD_TYPES: dict[str, type] = {cls.record_type: cls for cls in [
+    RecordStartGame, RecordStartTurn, RecordAttack, RecordPlayerEliminated, RecordDrewCard,
+    MoveClaimTerritory, MovePlaceInitialTroop, MoveRedeemCards, MoveDistributeTroops, MoveAttack,
+    MoveAttackPass, MoveDefend, MoveTroopsAfterAttack, MoveFortify, MoveFortifyPass,
+]}
+
+
+# What one player sees through game.state, shared with the engine but bound to a player
+class LocalGameState():
+    def __init__(self, engine: "LocalEngine", player_id: int):
+        self.engine = engine
+        self.map: LocalMap = engine.map
+        self.territories: dict[int, LocalTerritory] = engine.territories
+        self.players: dict[int, LocalPlayer] = engine.players
+        self.me: LocalPlayer = engine.players[player_id]
+        self.recording: list[LocalRecord] = engine.recording
+
+    @property
+    def turn_order(self) -> list[int]:
+        return self.engine.turn_order
+
+    @property
+    def card_sets_redeemed(self) -> int:
+        return self.engine.card_sets_redeemed
+
+    @property
+    def deck_card_count(self) -> int:
+        return len(self.engine.deck)
+
+    def get_territories_owned_by(self, player: Optional[int]) -> list[int]:
+        return [x for x, territory in self.territories.items() if territory.occupier == player]
+
+    def get_all_border_territories(self, territories: list[int]) -> list[int]:
+        territory_set = set(territories)
+        return [x for x in territories if not set(self.map.adjacent[x]) <= territory_set]
+
+    def get_all_adjacent_territories(self, territories: list[int]) -> list[int]:
+        territory_set = set(territories)
+        adjacent = set()
+        for x in territories:
+            adjacent.update(self.map.adjacent[x])
+        return list(adjacent - territory_set)
+
+    def get_card_set(self, cards: list[LocalCard]) -> Optional[tuple[LocalCard, LocalCard, LocalCard]]:
+        # Prefer sets that keep our wildcards
+        plain_cards = [card for card in cards if card.symbol != WILDCARD]
+        for candidates in [plain_cards, cards]:
+            for card_set in itertools.combinations(candidates, 3):
+                if is_card_set(card_set):
+                    return card_set
+        return None
+
+
+# Stand-in for risk_helper.game.Game, answering queries by building move records
+class LocalGame():
+    def __init__(self, engine: "LocalEngine", player_id: int):
+        self.player_id: int = player_id
+        self.state: LocalGameState = LocalGameState(engine, player_id)
+
+    def move_claim_territory(self, query: QueryClaimTerritory, territory_id: int) -> MoveClaimTerritory:
+        return MoveClaimTerritory(self.player_id, territory_id)
+
+    def move_place_initial_troop(self, query: QueryPlaceInitialTroop, territory_id: int) -> MovePlaceInitialTroop:
+        return MovePlaceInitialTroop(self.player_id, territory_id)
+
+    def move_redeem_cards(self, query: QueryRedeemCards, card_ids: list[tuple[int, int, int]]) -> MoveRedeemCards:
+        return MoveRedeemCards(self.player_id, [tuple(card_set) for card_set in card_ids], query.cause)
+
+    def move_distribute_troops(self, query: QueryDistributeTroops, distributions: dict[int, int]) -> MoveDistributeTroops:
+        return MoveDistributeTroops(self.player_id, {x: n for x, n in distributions.items() if n != 0}, query.cause)
+
+    def move_attack(self, query: QueryAttack, attacking_territory: int, defending_territory: int, attacking_troops: int) -> MoveAttack:
+        return MoveAttack(self.player_id, attacking_territory, defending_territory, attacking_troops)
+
+    def move_attack_pass(self, query: QueryAttack) -> MoveAttackPass:
+        return MoveAttackPass(self.player_id)
+
+    def move_troops_after_attack(self, query: QueryTroopsAfterAttack, troop_count: int) -> MoveTroopsAfterAttack:
+        return MoveTroopsAfterAttack(self.player_id, query.record_attack_id, troop_count)
+
+    def move_defend(self, query: QueryDefend, defending_troops: int) -> MoveDefend:
+        return MoveDefend(self.player_id, query.move_attack_id, defending_troops)
+
+    def move_fortify(self, query: QueryFortify, source_territory: int, target_territory: int, troop_count: int) -> MoveFortify:
+        return MoveFortify(self.player_id, source_territory, target_territory, troop_count)
+
+    def move_fortify_pass(self, query: QueryFortify) -> MoveFortifyPass:
+        return MoveFortifyPass(self.player_id)
+
+
+class GameResult():
+    def __init__(self, seed: Optional[int], ranking: list[int], turns: int, finished: bool, recording: list[LocalRecord]):
+        self.seed: Optional[int] = seed
+        self.ranking: list[int] = ranking # Best placed first
+        self.winner: int = ranking[0]
+        self.turns: int = turns
+        self.finished: bool = finished # False if the game hit the turn limit
+        self.recording: list[LocalRecord] = recording
+
+    def get_placement(self, player_id: int) -> int:
+        return self.ranking.index(player_id) + 1
+
+
+class LocalEngine():
+    def __init__(self, num_players: int = NUM_PLAYERS, seed: Optional[int] = None):
+        self.num_players: int = num_players
+        self.seed: Optional[int] = seed
+        self.rng = random.Random(seed)
+        self.map = LocalMap()
+        self.territories: dict[int, LocalTerritory] = {x: LocalTerritory(x) for x in range(NUM_TERRITORIES)}
+        self.players: dict[int, LocalPlayer] = {x: LocalPlayer(x) for x in range(num_players)}
+        self.recording: list[LocalRecord] = []
+        self.turn_order: list[int] = []
+        self.card_sets_redeemed: int = 0
+        self.turns: int = 0
+        self.eliminated: list[int] = [] # In elimination order
+        self.conquered_this_turn: bool = False
+
+        self.cards: dict[int, LocalCard] = {}
+        for x in range(NUM_TERRITORIES):
+            self.cards[x] = LocalCard(x, x, CARD_SYMBOLS[x % len(CARD_SYMBOLS)])
+        for x in range(NUM_TERRITORIES, NUM_TERRITORIES + WILDCARD_COUNT):
+            self.cards[x] = LocalCard(x, None, WILDCARD)
+        self.deck: list[LocalCard] = list(self.cards.values())
+        self.rng.shuffle(self.deck)
+        self.discarded: list[LocalCard] = []
+
+        self.games: dict[int, LocalGame] = {x: LocalGame(self, x) for x in range(num_players)}
+
+    def get_alive(self) -> list[int]:
+        return [x for x in self.turn_order if self.players[x].alive]
+
+    def get_owned(self, player_id: int) -> list[int]:
+        return [x for x, territory in self.territories.items() if territory.occupier == player_id]
+
+    # State changes, shared by live play and replay
+    def record(self, record: LocalRecord) -> int:
+        self.recording.append(record)
+        self.apply(record)
+        return len(self.recording) - 1
+
+    def apply(self, record: LocalRecord):
+        match record:
+            case RecordStartGame():
+                self.turn_order = list(record.turn_order)
+                for player in self.players.values():
+                    player.troops_remaining = record.initial_troops
+
+            case MoveClaimTerritory() | MovePlaceInitialTroop():
+                territory = self.territories[record.territory]
+                territory.occupier = record.move_by_player
+                territory.troops += 1
+                self.players[record.move_by_player].troops_remaining -= 1
+
+            case RecordStartTurn():
+                player = self.players[record.player]
+                player.troops_remaining += record.territory_bonus + record.continent_bonus
+                player.must_place_territory_bonus = []
+                self.conquered_this_turn = False
+                self.turns += 1
+
+            case MoveRedeemCards():
+                player = self.players[record.move_by_player]
+                for card_set in record.sets:
+                    player.troops_remaining += get_card_set_value(self.card_sets_redeemed)
+                    self.card_sets_redeemed += 1
+                    for card_id in card_set:
+                        card = self.cards[card_id]
+                        player.cards.remove(card)
+                        self.discarded.append(card)
+                        # Matching territory bonus is given once per turn
+                        if card.territory_id != None and self.territories[card.territory_id].occupier == player.player_id and len(player.must_place_territory_bonus) == 0:
+                            player.must_place_territory_bonus.append(card.territory_id)
+                            player.troops_remaining += MATCHING_TERRITORY_BONUS
+
+            case MoveDistributeTroops():
+                player = self.players[record.move_by_player]
+                for x, troops in record.distributions.items():
+                    self.territories[x].troops += troops
+                    player.troops_remaining -= troops
+                player.must_place_territory_bonus = []
+
+            case RecordAttack():
+                move_attack = self.recording[record.move_attack_id]
+                attacking = self.territories[move_attack.attacking_territory]
+                defending = self.territories[move_attack.defending_territory]
+                attacking.troops -= record.attacking_troops_lost
+                defending.troops -= record.defending_troops_lost
+                if record.territory_conquered:
+                    defending.occupier = move_attack.move_by_player
+                    self.conquered_this_turn = True
+
+            case MoveTroopsAfterAttack():
+                move_attack = self.recording[self.recording[record.record_attack_id].move_attack_id]
+                self.territories[move_attack.attacking_territory].troops -= record.troop_count
+                self.territories[move_attack.defending_territory].troops += record.troop_count
+
+            case RecordPlayerEliminated():
+                move_attack = self.recording[self.recording[record.record_attack_id].move_attack_id]
+                player = self.players[record.player]
+                player.alive = False
+                self.players[move_attack.move_by_player].cards.extend(player.cards)
+                player.cards = []
+                self.eliminated.append(player.player_id)
+
+            case MoveFortify():
+                self.territories[record.source_territory].troops -= record.troop_count
+                self.territories[record.target_territory].troops += record.troop_count
+
+            case RecordDrewCard():
+                card = self.cards[record.card]
+                if card in self.deck:
+                    self.deck.remove(card)
+                else:
+                    self.discarded.remove(card)
+                self.players[record.player].cards.append(card)
+
+    # Asking players
+    def ask(self, bots: dict, player_id: int, query: LocalQuery) -> LocalRecord:
+        return bots[player_id].choose_move(self.games[player_id], query)
+
+    def check(self, player_id: int, move, expected: type, condition: bool, reason: str):
+        if not isinstance(move, expected) or move.move_by_player != player_id:
+            raise IllegalMoveError(player_id, move, f"expected {expected.__name__}")
+        if not condition:
+            raise IllegalMoveError(player_id, move, reason)
+
+    def is_owned_by(self, territory: int, player_id: int) -> bool:
+        return territory in self.territories and self.territories[territory].occupier == player_id
+
+    def play_setup(self, bots: dict):
+        turn_order = list(range(self.num_players))
+        self.rng.shuffle(turn_order)
+        self.record(RecordStartGame(turn_order, INITIAL_TROOPS[self.num_players]))
+
+        unclaimed = NUM_TERRITORIES
+        for player_id in itertools.cycle(self.turn_order):
+            if unclaimed == 0:
+                break
+            move = self.ask(bots, player_id, QueryClaimTerritory())
+            self.check(player_id, move, MoveClaimTerritory, move.territory in self.territories and self.territories[move.territory].occupier == None, "territory already claimed")
+            self.record(move)
+            unclaimed -= 1
+
+        while any(self.players[x].troops_remaining > 0 for x in self.turn_order):
+            for player_id in self.turn_order:
+                if self.players[player_id].troops_remaining <= 0:
+                    continue
+                move = self.ask(bots, player_id, QueryPlaceInitialTroop())
+                self.check(player_id, move, MovePlaceInitialTroop, self.is_owned_by(move.territory, player_id), "territory not owned")
+                self.record(move)
+
+    def play_redeem(self, bots: dict, player_id: int, cause: str):
+        player = self.players[player_id]
+        move = self.ask(bots, player_id, QueryRedeemCards(cause=cause))
+        self.check(player_id, move, MoveRedeemCards, True, "")
+        used: set[int] = set()
+        owned = set(card.card_id for card in player.cards)
+        for card_set in move.sets:
+            self.check(player_id, move, MoveRedeemCards, len(card_set) == 3 and set(card_set) <= owned and used.isdisjoint(card_set), "cards not held or reused")
+            self.check(player_id, move, MoveRedeemCards, is_card_set([self.cards[x] for x in card_set]), "not a valid card set")
+            used.update(card_set)
+        remaining = len(player.cards) - len(used)
+        self.check(player_id, move, MoveRedeemCards, remaining < MAX_HAND_SIZE, "must redeem below the hand limit")
+        if cause == "player_eliminated":
+            self.check(player_id, move, MoveRedeemCards, len(move.sets) == 0 or remaining + 3 >= MAX_HAND_SIZE, "redeemed more sets than required")
+        self.record(move)
+
+    def play_distribute(self, bots: dict, player_id: int, cause: str):
+        player = self.players[player_id]
+        move = self.ask(bots, player_id, QueryDistributeTroops(cause=cause))
+        self.check(player_id, move, MoveDistributeTroops, True, "")
+        self.check(player_id, move, MoveDistributeTroops, all(self.is_owned_by(x, player_id) and n >= 0 for x, n in move.distributions.items()), "territory not owned or negative troops")
+        self.check(player_id, move, MoveDistributeTroops, sum(move.distributions.values()) == player.troops_remaining, "must distribute exactly the troops remaining")
+        if len(player.must_place_territory_bonus) != 0:
+            self.check(player_id, move, MoveDistributeTroops, any(move.distributions.get(x, 0) >= MATCHING_TERRITORY_BONUS for x in player.must_place_territory_bonus), "matching territory bonus not placed")
+        self.record(move)
+
+    def play_attack(self, bots: dict, player_id: int, move: MoveAttack):
+        attacking = self.territories.get(move.attacking_territory)
+        defending = self.territories.get(move.defending_territory)
+        self.check(player_id, move, MoveAttack, attacking != None and defending != None and attacking.occupier == player_id and defending.occupier != player_id, "must attack an enemy territory from our own")
+        self.check(player_id, move, MoveAttack, move.defending_territory in self.map.adjacent[move.attacking_territory], "territories are not adjacent")
+        self.check(player_id, move, MoveAttack, 1 <= move.attacking_troops <= min(MAX_ATTACK_DICE, attacking.troops - 1), "invalid number of attacking troops")
+        move_attack_id = self.record(move)
+
+        defender_id = defending.occupier
+        defend = self.ask(bots, defender_id, QueryDefend(move_attack_id=move_attack_id))
+        self.check(defender_id, defend, MoveDefend, 1 <= defend.defending_troops <= min(MAX_DEFEND_DICE, defending.troops), "invalid number of defending troops")
+        move_defend_id = self.record(defend)
+
+        attack_dice = sorted((self.rng.randint(1, 6) for _ in range(move.attacking_troops)), reverse=True)
+        defend_dice = sorted((self.rng.randint(1, 6) for _ in range(defend.defending_troops)), reverse=True)
+        attacking_troops_lost = 0
+        defending_troops_lost = 0
+        for a, d in zip(attack_dice, defend_dice):
+            if a > d:
+                defending_troops_lost += 1
+            else:
+                attacking_troops_lost += 1
+        conquered = defending.troops - defending_troops_lost == 0
+        eliminated = conquered and len(self.get_owned(defender_id)) == 1
+        record_attack_id = self.record(RecordAttack(move_attack_id, move_defend_id, attacking_troops_lost, defending_troops_lost, conquered, eliminated))
+        if not conquered:
+            return
+
+        after = self.ask(bots, player_id, QueryTroopsAfterAttack(record_attack_id=record_attack_id))
+        min_troops = move.attacking_troops - attacking_troops_lost
+        self.check(player_id, after, MoveTroopsAfterAttack, min_troops <= after.troop_count <= attacking.troops - 1, "invalid number of troops moved")
+        self.record(after)
+
+        if eliminated:
+            eliminated_cards = [card.card_id for card in self.players[defender_id].cards]
+            self.record(RecordPlayerEliminated(defender_id, record_attack_id, eliminated_cards))
+            if len(self.get_alive()) > 1 and len(self.players[player_id].cards) >= MAX_HAND_SIZE:
+                self.play_redeem(bots, player_id, "player_eliminated")
+                if self.players[player_id].troops_remaining > 0:
+                    self.play_distribute(bots, player_id, "player_eliminated")
+
+    def play_fortify(self, bots: dict, player_id: int):
+        move = self.ask(bots, player_id, QueryFortify())
+        if isinstance(move, MoveFortifyPass) and move.move_by_player == player_id:
+            self.record(move)
+            return
+        self.check(player_id, move, MoveFortify, self.is_owned_by(move.source_territory, player_id) and self.is_owned_by(move.target_territory, player_id), "territory not owned")
+        self.check(player_id, move, MoveFortify, move.target_territory in self.map.adjacent[move.source_territory], "territories are not adjacent")
+        self.check(player_id, move, MoveFortify, 1 <= move.troop_count < self.territories[move.source_territory].troops, "invalid number of troops moved")
+        self.record(move)
+
+    def draw_card(self, player_id: int):
+        if len(self.deck) == 0:
+            self.deck = self.discarded
+            self.discarded = []
+            self.rng.shuffle(self.deck)
+        if len(self.deck) == 0:
+            return
+        self.record(RecordDrewCard(player_id, self.deck[-1].card_id))
+
+    def play_turn(self, bots: dict, player_id: int):
+        owned = self.get_owned(player_id)
+        continents_held = [cont for cont, territories in CONTINENTS.items() if all(self.territories[x].occupier == player_id for x in territories)]
+        territory_bonus = max(MIN_TURN_TROOPS, len(owned) // TERRITORIES_PER_TROOP)
+        continent_bonus = sum(CONTINENT_BONUSES[cont] for cont in continents_held)
+        self.record(RecordStartTurn(player_id, len(owned), continents_held, territory_bonus, continent_bonus))
+
+        self.play_redeem(bots, player_id, "turn_started")
+        self.play_distribute(bots, player_id, "turn_started")
+
+        while len(self.get_alive()) > 1:
+            move = self.ask(bots, player_id, QueryAttack())
+            if isinstance(move, MoveAttackPass) and move.move_by_player == player_id:
+                self.record(move)
+                break
+            self.check(player_id, move, MoveAttack, True, "")
+            self.play_attack(bots, player_id, move)
+
+        if len(self.get_alive()) > 1:
+            self.play_fortify(bots, player_id)
+        if self.conquered_this_turn:
+            self.draw_card(player_id)
+
+    def get_ranking(self) -> list[int]:
+        alive = sorted(self.get_alive(), key=lambda x: (len(self.get_owned(x)), sum(self.territories[t].troops for t in self.get_owned(x))), reverse=True)
+        return alive + list(reversed(self.eliminated))
+
+    def play(self, bots: dict, max_turns: int = MAX_TURNS) -> GameResult:
+        self.play_setup(bots)
+        while len(self.get_alive()) > 1 and self.turns < max_turns:
+            for player_id in self.turn_order:
+                if not self.players[player_id].alive:
+                    continue
+                if len(self.get_alive()) <= 1 or self.turns >= max_turns:
+                    break
+                self.play_turn(bots, player_id)
+        return GameResult(self.seed, self.get_ranking(), self.turns, len(self.get_alive()) <= 1, self.recording)
+
+
+# Bots
+class RandomBot():
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+
+    def choose_move(self, game: LocalGame, query: LocalQuery) -> LocalRecord:
+        state = game.state
+        me = state.me.player_id
+        my_territories = state.get_territories_owned_by(me)
+        match query.query_type:
+            case "claim_territory":
+                return game.move_claim_territory(query, self.rng.choice(state.get_territories_owned_by(None)))
+
+            case "place_initial_troop":
+                return game.move_place_initial_troop(query, self.rng.choice(my_territories))
+
+            case "redeem_cards":
+                card_sets = []
+                cards_remaining = list(state.me.cards)
+                while len(cards_remaining) >= MAX_HAND_SIZE:
+                    card_set = state.get_card_set(cards_remaining)
+                    card_sets.append(card_set)
+                    cards_remaining = [card for card in cards_remaining if card not in card_set]
+                return game.move_redeem_cards(query, [tuple(card.card_id for card in card_set) for card_set in card_sets])
+
+            case "distribute_troops":
+                distributions = {x: 0 for x in my_territories}
+                troops = state.me.troops_remaining
+                if len(state.me.must_place_territory_bonus) != 0:
+                    distributions[state.me.must_place_territory_bonus[0]] += MATCHING_TERRITORY_BONUS
+                    troops -= MATCHING_TERRITORY_BONUS
+                for _ in range(troops):
+                    distributions[self.rng.choice(my_territories)] += 1
+                return game.move_distribute_troops(query, distributions)
+
+            case "attack":
+                candidates = [(a, t) for a in my_territories if state.territories[a].troops > 1 for t in state.map.get_adjacent_to(a) if state.territories[t].occupier != me]
+                if len(candidates) == 0 or self.rng.random() < 0.3:
+                    return game.move_attack_pass(query)
+                a, t = self.rng.choice(candidates)
+                return game.move_attack(query, a, t, min(MAX_ATTACK_DICE, state.territories[a].troops - 1))
+
+            case "troops_after_attack":
+                record_attack = state.recording[query.record_attack_id]
+                move_attack = state.recording[record_attack.move_attack_id]
+                min_troops = move_attack.attacking_troops - record_attack.attacking_troops_lost
+                return game.move_troops_after_attack(query, self.rng.randint(min_troops, state.territories[move_attack.attacking_territory].troops - 1))
+
+            case "defend":
+                move_attack = state.recording[query.move_attack_id]
+                return game.move_defend(query, min(MAX_DEFEND_DICE, state.territories[move_attack.defending_territory].troops))
+
+            case "fortify":
+                candidates = [(s, t) for s in my_territories if state.territories[s].troops > 1 for t in state.map.get_adjacent_to(s) if state.territories[t].occupier == me]
+                if len(candidates) == 0 or self.rng.random() < 0.5:
+                    return game.move_fortify_pass(query)
+                s, t = self.rng.choice(candidates)
+                return game.move_fortify(query, s, t, self.rng.randint(1, state.territories[s].troops - 1))
+
+        raise ValueError(f"unknown query {query!r}")
+
+
+def load_bot_module(path: str):
+    # Each call gives a fresh copy, so seats never share module level caches
+    load_bot_module.count = getattr(load_bot_module, "count", 0) + 1
+    name = "local_bot_%d" % load_bot_module.count
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# Drives a bot script's handle_* functions in-process
+class HandlerBot():
+    def __init__(self, path: str, quiet: bool = True, overrides: Optional[dict] = None):
+        self.path: str = path
+        self.module = load_bot_module(path)
+        # Module level constants to replace, e.g. for tuning CARDS_REDEEMED_LATE_GAME
+        for name, value in (overrides or {}).items():
+            if not hasattr(self.module, name):
+                raise AttributeError(f"{path} has no constant {name}")
+            setattr(self.module, name, value)
+        if overrides and hasattr(self.module, "rebuild_tables"):
+            # Tables derived from the constants were built at import with the old values
+            self.module.rebuild_tables()
+        self.output = open(os.devnull, "w") if quiet else None
+        if quiet and hasattr(self.module, "logger"):
+            # Skip formatting debug output nobody will read
+            self.module.logger.level = self.module.LOG_OFF
+        self.bot_state = self.module.BotState()
+        self.self_state = None
+
+    def choose_move(self, game: LocalGame, query: LocalQuery) -> LocalRecord:
+        handler = getattr(self.module, QUERY_HANDLERS[query.query_type])
+        with contextlib.redirect_stdout(self.output) if self.output != None else contextlib.nullcontext():
+            if self.self_state == None:
+                if hasattr(self.module, "get_static_map"):
+                    self.self_state = self.module.SelfState(self.module.get_static_map(game))
+                else:
+                    self.self_state = self.module.SelfState()
+            if hasattr(self.module, "begin_query"):
+                self.module.begin_query(game, self.self_state)
+            move = handler(game, self.self_state, self.bot_state, query)
+            if query.query_type == "fortify" and hasattr(self.module, "end_turn"):
+                self.module.end_turn(game, self.self_state)
+            return move
+
+# "random", a bot script path, or a path with constant overrides: "gacha-v2-4.py:MIN_ATK_WIN_PROB=0.5,MIN_CHOKE=3"
+def parse_bot_spec(spec: str) -> tuple[str, dict]:
+    path, _, override_text = spec.partition(":")
+    overrides = {}
+    for item in filter(None, override_text.split(",")):
+        name, _, value = item.partition("=")
+        overrides[name.strip()] = ast.literal_eval(value.strip())
+    return path, overrides
+
+def make_bot(spec: str, seed: Optional[int] = None, quiet: bool = True):
+    if spec == "random":
+        return RandomBot(seed)
+    path, overrides = parse_bot_spec(spec)
+    return HandlerBot(path, quiet, overrides)
+
+def play_game(bot_specs: list[str], seed: Optional[int] = None, max_turns: int = MAX_TURNS, quiet: bool = True) -> GameResult:
+    engine = LocalEngine(len(bot_specs), seed)
+    bots = {x: make_bot(spec, None if seed == None else seed * len(bot_specs) + x, quiet) for x, spec in enumerate(bot_specs)}
+    return engine.play(bots, max_turns)
+
+
+# Recordings
+def save_recording(path: str, result: GameResult, bot_specs: list[str]):
+    with open(path, "w") as f:
+        json.dump({
+            "seed": result.seed,
+            "bots": bot_specs,
+            "ranking": result.ranking,
+            "turns": result.turns,
+            "recording": [record.to_dict() for record in result.recording],
+        }, f)
+
+def load_recording(path: str) -> tuple[dict, list[LocalRecord]]:
+    with open(path) as f:
+        data = json.load(f)
+    records = [RECORD_TYPES[x["record_type"]].from_dict(x) for x in data.pop("recording")]
+    return data, records
+
+# Rebuilds the board record by record, calling on_record(engine, record_id) after each one
+def replay_recording(num_players: int, records: list[LocalRecord], on_record=None) -> LocalEngine:
+    engine = LocalEngine(num_players)
+    for record in records:
+        record_id = engine.record(record)
+        if on_record != None:
+            on_record(engine, record_id)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play one game on the local engine.")
+    parser.add_argument("bots", nargs="+", help="bot script paths (optionally path:NAME=value,...), or 'random'")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS)
+    parser.add_argument("--save", default=None, help="write the recording to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="show bot output")
+    args = parser.parse_args()
+
+    result = play_game(args.bots, args.seed, args.max_turns, not args.verbose)
+    print("turns: %d%s" % (result.turns, "" if result.finished else " (turn limit)"), flush=True)
+    for place, player_id in enumerate(result.ranking):
+        print("%d. player %d (%s)" % (place + 1, player_id, args.bots[player_id]), flush=True)
+    if args.save != None:
+        save_recording(args.save, result, args.bots)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Plays many seeded games on the local engine across all CPU cores and compares bots.
+
+Usage:
+    python tournament.py --games 200 gacha-v2-4.py gacha-v2-3.py gacha-v2-3.py random random
+    python tournament.py --games 200 gacha-v2-4.py:CARDS_REDEEMED_LATE_GAME=6 gacha-v2-4.py gacha-v2-3.py random random
+"""
+import argparse
+import json
+import os
+import statistics
+import traceback
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import local_engine
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LINEUP = [os.path.join(REPO_DIR, "gacha-v2-4.py"), os.path.join(REPO_DIR, "gacha-v2-3.py"), os.path.join(REPO_DIR, "gacha-v2-3.py"), "random", "random"]
+CHUNK_SIZE = 4 # Games handed to a worker at a time
+
+
+def run_game(task: tuple[list[str], int, int]) -> dict:
+    bot_specs, seed, max_turns = task
+    try:
+        result = local_engine.play_game(bot_specs, seed, max_turns)
+        return {"seed": seed, "ranking": result.ranking, "turns": result.turns, "finished": result.finished, "error": None}
+    except Exception as e:
+        # Keep the batch running, the failing seed can be replayed with local_engine.py --verbose
+        return {"seed": seed, "ranking": None, "turns": None, "finished": False, "error": "%s: %s" % (type(e).__name__, e), "traceback": traceback.format_exc()}
+
+
+class BotStats():
+    def __init__(self, spec: str, seats: int):
+        self.spec: str = spec
+        self.seats: int = seats # Seats this bot takes in every game
+        self.wins: int = 0
+        self.placements: list[int] = []
+
+    def get_win_rate(self, games: int) -> float:
+        return self.wins / games if games > 0 else 0.0
+
+    def get_mean_placement(self) -> float:
+        return statistics.mean(self.placements) if len(self.placements) > 0 else 0.0
+
+
+def aggregate(bot_specs: list[str], results: list[dict]) -> dict:
+    stats: dict[str, BotStats] = {}
+    for spec in bot_specs:
+        if spec not in stats:
+            stats[spec] = BotStats(spec, bot_specs.count(spec))
+
+    completed = [result for result in results if result["error"] == None]
+    for result in completed:
+        ranking = result["ranking"]
+        stats[bot_specs[ranking[0]]].wins += 1
+        for seat, spec in enumerate(bot_specs):
+            stats[spec].placements.append(ranking.index(seat) + 1)
+
+    turns = [result["turns"] for result in completed]
+    return {
+        "games": len(completed),
+        "unfinished": len([result for result in completed if not result["finished"]]),
+        "errors": [result for result in results if result["error"] != None],
+        "turns_mean": statistics.mean(turns) if len(turns) > 0 else 0.0,
+        "turns_median": statistics.median(turns) if len(turns) > 0 else 0.0,
+        "turns_max": max(turns) if len(turns) > 0 else 0,
+        "bots": stats,
+    }
+
+
+def print_summary(bot_specs: list[str], summary: dict):
+    games = summary["games"]
+    print("games: %d (hit turn limit: %d, errors: %d)" % (games, summary["unfinished"], len(summary["errors"])), flush=True)
+    print("turns: mean %.1f, median %.1f, max %d" % (summary["turns_mean"], summary["turns_median"], summary["turns_max"]), flush=True)
+    print("%-50s %5s %6s %9s %9s %9s" % ("bot", "seats", "wins", "win rate", "expected", "mean pl."), flush=True)
+    for bot in summary["bots"].values():
+        print("%-50s %5d %6d %8.1f%% %8.1f%% %9.2f" % (bot.spec, bot.seats, bot.wins, 100 * bot.get_win_rate(games), 100 * bot.seats / len(bot_specs), bot.get_mean_placement()), flush=True)
+    for error in summary["errors"][:5]:
+        print("seed %d: %s" % (error["seed"], error["error"]), flush=True)
+
+
+def run_tournament(bot_specs: list[str], games: int, first_seed: int = 0, max_turns: int = local_engine.MAX_TURNS, jobs: Optional[int] = None) -> list[dict]:
+    tasks = [(bot_specs, seed, max_turns) for seed in range(first_seed, first_seed + games)]
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for result in executor.map(run_game, tasks, chunksize=CHUNK_SIZE):
+            results.append(result)
+            if len(results) % max(1, games // 10) == 0:
+                print("played %d/%d" % (len(results), games), flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play seeded local games in parallel and compare bots.")
+    parser.add_argument("bots", nargs="*", default=DEFAULT_LINEUP, help="one spec per seat: bot script path (optionally path:NAME=value,...), or 'random'")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, later games count up from it")
+    parser.add_argument("--max-turns", type=int, default=local_engine.MAX_TURNS)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--json", default=None, help="write per-game results to this file")
+    args = parser.parse_args()
+
+    results = run_tournament(args.bots, args.games, args.seed, args.max_turns, args.jobs)
+    print_summary(args.bots, aggregate(args.bots, results))
+    if args.json != None:
+        with open(args.json, "w") as f:
+            json.dump({"bots": args.bots, "results": results}, f)
+
+
+if __name__ == "__main__":
+    main()